@@ -1,23 +1,205 @@
 from collections import Counter
 import re
-from agents.message_bus import bus  # type: ignore 
+import numpy as np  # type: ignore
+from agents.message_bus import bus  # type: ignore
+from agents.database import get_db_connection, log_agent_action  # type: ignore
+from agents.paper import PaperBatch  # type: ignore
+from agents.trends import record_trend_buckets  # type: ignore
+from agents.metrics import span  # type: ignore
 
-def analyze_papers(papers):
-    all_words = []
+TOKEN_RE = re.compile(r"\b[a-z]{3,}\b")
 
-    for paper in papers:
-        text = paper["title"] + " " + paper["summary"]
-        words = re.findall(r"\b[a-zA-Z]{5,}\b", text.lower())
-        all_words.extend(words)
+STOPWORDS = frozenset("""
+about above across after again against all also although among and another any are based because
+been before being below between both but can cannot could does doing down during each either
+especially even every first for from further given had has have having her here his how however
+including into its itself just many may might more most much must neither new non not now often one
+only other otherwise our out over per perhaps rather same see several should show shown shows since
+some such than that the their them then there these they this those though through thus two under
+until upon use used using various very via was way well were what when where whether which while
+who whose with within without would yet you your
+able achieve achieves approach approaches data demonstrate different existing large method methods
+model models novel paper papers performance present presents problem problems propose proposed
+provide provides result results set studies study task tasks work works
+""".split())
 
-    keyword_counts = Counter(all_words)
-    return keyword_counts.most_common(5)
 
-def analyze_from_bus():
-    papers = bus.consume("papers")  
-    if not papers:
+def tokenize(text, min_length=3, stopwords=STOPWORDS):
+    """Lowercased word tokens, without stopwords or words shorter than min_length"""
+    return [w for w in TOKEN_RE.findall(text.lower()) if len(w) >= min_length and w not in stopwords]
+
+
+def _paper_text(paper):
+    return paper["title"] + " " + paper["summary"]
+
+
+def _terms(tokens, bigrams):
+    if not bigrams:
+        return tokens
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def count_terms(texts, min_length=3, stopwords=STOPWORDS, bigrams=False):
+    """Stream term counts over many texts without materializing every token"""
+    counts = Counter()
+    for text in texts:
+        counts.update(_terms(tokenize(text, min_length, stopwords), bigrams))
+    return counts
+
+
+class TermMatrix:
+    """Sparse document-term count matrix in CSR form (indptr, indices, data)"""
+
+    def __init__(self, vocabulary, indptr, indices, data):
+        self.vocabulary = vocabulary  # term id -> term
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @classmethod
+    def from_batch(cls, batch, min_length=3, stopwords=STOPWORDS, bigrams=False):
+        return cls.from_texts(batch.texts(), min_length, stopwords, bigrams)
+
+    @classmethod
+    def from_texts(cls, texts, min_length=3, stopwords=STOPWORDS, bigrams=False):
+        term_ids = {}
+        indptr = [0]
+        indices = []
+        data = []
+        for text in texts:
+            doc_counts = Counter(_terms(tokenize(text, min_length, stopwords), bigrams))
+            for term, count in doc_counts.items():
+                indices.append(term_ids.setdefault(term, len(term_ids)))
+                data.append(count)
+            indptr.append(len(indices))
+
+        vocabulary = [None] * len(term_ids)
+        for term, i in term_ids.items():
+            vocabulary[i] = term
+        return cls(
+            vocabulary,
+            np.asarray(indptr, dtype=np.int64),
+            np.asarray(indices, dtype=np.int32),
+            np.asarray(data, dtype=np.float32),
+        )
+
+    @property
+    def n_docs(self):
+        return len(self.indptr) - 1
+
+    def term_counts(self):
+        return np.bincount(self.indices, weights=self.data, minlength=len(self.vocabulary))
+
+    def document_frequency(self):
+        return np.bincount(self.indices, minlength=len(self.vocabulary))
+
+    def tfidf_scores(self):
+        """Sum of per-document TF-IDF weights for each term (smoothed IDF, length-normalized TF)"""
+        idf = np.log((1 + self.n_docs) / (1 + self.document_frequency())) + 1
+        doc_of_entry = np.repeat(np.arange(self.n_docs), np.diff(self.indptr))
+        doc_lengths = np.bincount(doc_of_entry, weights=self.data, minlength=self.n_docs)
+        weights = self.data / doc_lengths[doc_of_entry] * idf[self.indices]
+        return np.bincount(self.indices, weights=weights, minlength=len(self.vocabulary))
+
+    def top_terms(self, k=5, scoring="count"):
+        scores = self.tfidf_scores() if scoring == "tfidf" else self.term_counts()
+        if not len(scores):
+            return []
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.vocabulary[i], round(float(scores[i]), 4) if scoring == "tfidf" else int(scores[i]))
+                for i in top]
+
+
+def top_keywords(papers, k=5, scoring="count", bigrams=False, min_length=3):
+    """Top-k terms over Paper records, paper dicts or a PaperBatch"""
+    with span("analysis"):
+        batch = PaperBatch.from_papers(papers)
+        if scoring == "tfidf":
+            return TermMatrix.from_batch(batch, min_length, bigrams=bigrams).top_terms(k, scoring)
+        return count_terms(batch.texts(), min_length, bigrams=bigrams).most_common(k)
+
+
+def analyze_papers(papers, top_k=5):
+    return top_keywords(papers, k=top_k, min_length=5)
+
+# === Incremental Trend Index ===
+
+def _index_topic(topic):
+    return topic.strip().lower()
+
+
+def index_papers(topic, papers):
+    """Add papers not yet seen for this topic (by arXiv link) to the term index; returns how many were new"""
+    topic = _index_topic(topic)
+    day_counts = Counter()
+    totals = Counter()
+    new_entries = []
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        for paper in papers:
+            cursor.execute(
+                "INSERT OR IGNORE INTO indexed_papers (topic, link, published) VALUES (?, ?, ?)",
+                (topic, paper["link"], paper["published"])
+            )
+            if cursor.rowcount == 0:
+                continue
+            terms = tokenize(_paper_text(paper))
+            new_entries.append((paper["published"], terms))
+            day = paper["published"][:10]
+            for term in terms:
+                day_counts[(day, term)] += 1
+                totals[term] += 1
+
+        cursor.executemany(
+            "INSERT INTO term_counts (topic, day, term, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(topic, day, term) DO UPDATE SET count = count + excluded.count",
+            [(topic, day, term, n) for (day, term), n in day_counts.items()]
+        )
+        cursor.executemany(
+            "INSERT INTO term_totals (topic, term, count) VALUES (?, ?, ?) "
+            "ON CONFLICT(topic, term) DO UPDATE SET count = count + excluded.count",
+            [(topic, term, n) for term, n in totals.items()]
+        )
+        record_trend_buckets(cursor, topic, new_entries)
+        conn.commit()
+    finally:
+        conn.close()
+    log_agent_action("analysis_agent", "index", {"topic": topic, "new_papers": len(new_entries)})
+    return len(new_entries)
+
+
+def top_indexed_terms(topic, k=5, since=None, until=None):
+    """Top-k terms for a topic from the index, optionally limited to papers published in [since, until]"""
+    topic = _index_topic(topic)
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        if since is None and until is None:
+            cursor.execute(
+                "SELECT term, count FROM term_totals WHERE topic=? ORDER BY count DESC LIMIT ?",
+                (topic, k)
+            )
+        else:
+            cursor.execute(
+                "SELECT term, SUM(count) AS count FROM term_counts "
+                "WHERE topic=? AND day >= ? AND day <= ? GROUP BY term ORDER BY count DESC LIMIT ?",
+                (topic, since or "0000-00-00", until or "9999-99-99", k)
+            )
+        return [(row["term"], row["count"]) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def analyze_from_bus(correlation_id=None):
+    papers = bus.consume("papers", correlation_id)
+    if papers is None:
         return []
 
     keywords = analyze_papers(papers)
-    bus.publish("keywords", keywords)  
+    log_agent_action("analysis_agent", "analyze", {"papers": len(papers), "keywords": keywords})
+    bus.publish("keywords", keywords, correlation_id=correlation_id, sender="analysis_agent")
     return keywords
@@ -0,0 +1,272 @@
+import asyncio
+import json
+import time
+import uuid
+from agents.research_agent import afetch_arxiv_papers  # type: ignore
+from agents.analysis_agent import analyze_papers  # type: ignore
+from agents.innovation_agent import abatch_research_ideas, format_innovation_proposal  # type: ignore
+from agents.database import get_db_connection, save_proposals, log_agent_action  # type: ignore
+
+BATCH_MAX_TOPICS = 50
+BATCH_MAX_RESULTS = 100            # papers fetched per topic
+BATCH_FETCH_CONCURRENCY = 8
+BATCH_MAX_RUNNING_PER_USER = 2
+BATCH_MAX_JOBS = 100               # finished jobs beyond this are forgotten, oldest first
+BATCH_STALE_SECONDS = 600          # a running job not saved for this long died with its worker
+BATCH_STREAM_POLL_SECONDS = 0.5    # how often a stream checks for events saved by another worker
+
+
+class BatchJobLimitError(Exception):
+    """The user already has BATCH_MAX_RUNNING_PER_USER jobs running"""
+
+
+class BatchJob:
+    """Proposal generation for many topics, with per-topic progress and an event log for streaming.
+
+    The job runs in the worker that started it, but its state and events are
+    saved to batch_jobs / batch_job_events as they change, so any worker can
+    answer status and stream requests for it.
+    """
+
+    def __init__(self, user, topics, max_results=5):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        self.topics = topics
+        self.max_results = max_results
+        self.status = "queued"
+        self.error = None
+        self.results = {topic: {"topic": topic, "status": "pending"} for topic in topics}
+        self.created_at = time.time()
+        self.finished_at = None
+        self.saves = 0
+        self._changed = asyncio.Condition()
+        self._task = None
+
+    def _save(self, event=None):
+        conn = get_db_connection()
+        try:
+            conn.execute(
+                "UPDATE batch_jobs SET status=?, error=?, results=?, updated_at=?, finished_at=? WHERE id=?",
+                (self.status, self.error, json.dumps(list(self.results.values())), time.time(),
+                 self.finished_at, self.id)
+            )
+            if event is not None:
+                conn.execute("INSERT INTO batch_job_events (job_id, event) VALUES (?, ?)", (self.id, json.dumps(event)))
+            conn.commit()
+        finally:
+            conn.close()
+
+    async def _emit(self, event=None):
+        """Save the job's state, plus an event for streams if given, and wake streams in this worker"""
+        await asyncio.to_thread(self._save, event)
+        async with self._changed:
+            self.saves += 1
+            self._changed.notify_all()
+
+    async def wait_saved(self, seen, timeout):
+        """Wait up to timeout seconds for a save after the first `seen` ones"""
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait_for(lambda: self.saves > seen), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _prepare(self, topic, semaphore):
+        """Fetch and analyze one topic; returns its keyword list or None if it failed"""
+        result = self.results[topic]
+        try:
+            async with semaphore:
+                papers = await afetch_arxiv_papers(topic, self.max_results)
+            if not papers:
+                raise ValueError("No papers found")
+            keywords = [kw for kw, _ in await asyncio.to_thread(analyze_papers, papers)]
+        except Exception as e:
+            result.update(status="failed", error=str(e))
+            await self._emit({"type": "result", **result})
+            return None
+        result.update(status="generating", papers=len(papers), keywords=keywords)
+        await self._emit()
+        return keywords
+
+    async def run(self):
+        self.status = "running"
+        started = time.perf_counter()
+        try:
+            await self._emit()
+            semaphore = asyncio.Semaphore(BATCH_FETCH_CONCURRENCY)
+            prepared = await asyncio.gather(*(self._prepare(topic, semaphore) for topic in self.topics))
+            ready = [(topic, keywords) for topic, keywords in zip(self.topics, prepared) if keywords is not None]
+
+            async for i, proposal in abatch_research_ideas([kw for _, kw in ready], user=self.user):
+                topic = ready[i][0]
+                result = self.results[topic]
+                if proposal.startswith("❌"):
+                    result.update(status="failed", error=proposal)
+                else:
+                    result.update(status="done", proposal=proposal,
+                                  formatted=await asyncio.to_thread(format_innovation_proposal, proposal))
+                await self._emit({"type": "result", **result})
+
+            done = [r for r in self.results.values() if r["status"] == "done"]
+            ids = await asyncio.to_thread(
+                save_proposals, self.user, [(r["topic"], r["keywords"], r["proposal"]) for r in done]
+            )
+            for result, proposal_id in zip(done, ids):
+                result["proposal_id"] = proposal_id
+            self.status = "completed"
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+        finally:
+            self.finished_at = time.time()
+            summary = self.progress()
+            log_agent_action("batch", "innovate", {
+                "job_id": self.id, "user": self.user, "topics": len(self.topics), "status": self.status,
+                "done": summary["done"], "failed": summary["failed"],
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            })
+            try:
+                await self._emit({"type": "done", **summary,
+                                  "proposal_ids": {r["topic"]: r.get("proposal_id") for r in self.results.values()}})
+            finally:
+                running_jobs.pop(self.id, None)
+
+    def progress(self):
+        return _progress(self.id, self.status, self.error, list(self.results.values()), self.created_at, self.finished_at)
+
+
+def _progress(job_id, status, error, results, created_at, finished_at):
+    counts = {"pending": 0, "generating": 0, "done": 0, "failed": 0}
+    for result in results:
+        counts[result["status"]] += 1
+    return {
+        "job_id": job_id,
+        "status": status,
+        "error": error,
+        "total": len(results),
+        **counts,
+        "created_at": created_at,
+        "finished_at": finished_at,
+    }
+
+
+def _is_stale(row):
+    return row["finished_at"] is None and row["updated_at"] <= time.time() - BATCH_STALE_SECONDS
+
+
+def _job_status(row):
+    results = json.loads(row["results"])
+    status, error = row["status"], row["error"]
+    if _is_stale(row):
+        status, error = "failed", "the worker running this job stopped"
+    return {**_progress(row["id"], status, error, results, row["created_at"], row["finished_at"]), "results": results}
+
+
+running_jobs = {}  # job id -> BatchJob running in this worker
+
+
+def _insert_job(job):
+    """Record a new job unless its user is at the running-job limit; returns whether it was recorded.
+
+    Finished (or abandoned) jobs beyond BATCH_MAX_JOBS are deleted with their events.
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        stale_before = time.time() - BATCH_STALE_SECONDS
+        running = conn.execute(
+            "SELECT COUNT(*) FROM batch_jobs WHERE username=? AND finished_at IS NULL AND updated_at > ?",
+            (job.user, stale_before)
+        ).fetchone()[0]
+        if running >= BATCH_MAX_RUNNING_PER_USER:
+            conn.rollback()
+            return False
+        conn.execute(
+            "INSERT INTO batch_jobs (id, username, topics, max_results, status, results, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job.id, job.user, json.dumps(job.topics), job.max_results, job.status,
+             json.dumps(list(job.results.values())), job.created_at, job.created_at)
+        )
+        evicted = [(row["id"],) for row in conn.execute(
+            "SELECT id FROM batch_jobs WHERE finished_at IS NOT NULL OR updated_at <= ? "
+            "ORDER BY COALESCE(finished_at, updated_at) DESC LIMIT -1 OFFSET ?",
+            (stale_before, BATCH_MAX_JOBS)
+        )]
+        conn.executemany("DELETE FROM batch_job_events WHERE job_id=?", evicted)
+        conn.executemany("DELETE FROM batch_jobs WHERE id=?", evicted)
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+
+async def start_batch_job(user, topics, max_results=5):
+    """Create a job for the given topics and start it on the running event loop.
+
+    Raises ValueError for an invalid request and BatchJobLimitError when the
+    user already has BATCH_MAX_RUNNING_PER_USER jobs running on any worker.
+    """
+    topics = list(dict.fromkeys(t.strip() for t in topics if t and t.strip()))
+    if not topics:
+        raise ValueError("at least one topic is required")
+    if len(topics) > BATCH_MAX_TOPICS:
+        raise ValueError(f"at most {BATCH_MAX_TOPICS} topics per batch")
+    if not 1 <= max_results <= BATCH_MAX_RESULTS:
+        raise ValueError(f"max_results must be between 1 and {BATCH_MAX_RESULTS}")
+
+    job = BatchJob(user, topics, max_results)
+    if not await asyncio.to_thread(_insert_job, job):
+        raise BatchJobLimitError(f"at most {BATCH_MAX_RUNNING_PER_USER} batch jobs can run at once")
+    running_jobs[job.id] = job
+    job._task = asyncio.create_task(job.run())
+    return job
+
+
+def get_batch_job(job_id, user):
+    """Progress and per-topic results of one of the user's jobs, whichever worker runs it; None if unknown"""
+    conn = get_db_connection()
+    try:
+        row = conn.execute("SELECT * FROM batch_jobs WHERE id=? AND username=?", (job_id, user)).fetchone()
+    finally:
+        conn.close()
+    return _job_status(row) if row is not None else None
+
+
+def _events_after(job_id, after_id):
+    """Saved events past after_id, and the job's status if it can produce no more (stale or deleted)"""
+    conn = get_db_connection()
+    try:
+        events = [(row["id"], json.loads(row["event"])) for row in conn.execute(
+            "SELECT id, event FROM batch_job_events WHERE job_id=? AND id > ? ORDER BY id", (job_id, after_id)
+        )]
+        row = conn.execute("SELECT * FROM batch_jobs WHERE id=?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return events, {"job_id": job_id, "status": "failed", "error": "job was removed"}
+    return events, _job_status(row) if _is_stale(row) else None
+
+
+async def stream_batch_job(job_id):
+    """Yield the job's events so far, then new ones as they are saved, ending with the "done" event.
+
+    Woken by the job itself when it runs in this worker; otherwise polls every
+    BATCH_STREAM_POLL_SECONDS.
+    """
+    last_id = 0
+    while True:
+        job = running_jobs.get(job_id)
+        seen = job.saves if job is not None else 0
+        events, ended = await asyncio.to_thread(_events_after, job_id, last_id)
+        for last_id, event in events:
+            yield event
+            if event["type"] == "done":
+                return
+        if ended is not None:
+            ended.pop("results", None)
+            yield {"type": "done", **ended, "proposal_ids": {}}
+            return
+        if job is not None:
+            await job.wait_saved(seen, BATCH_STREAM_POLL_SECONDS)
+        else:
+            await asyncio.sleep(BATCH_STREAM_POLL_SECONDS)
@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+CONFIG_FILE = "config.json"
+DEFAULT_CONFIG = {"topic": "AI", "max_results": 5}
+CONFIG_CHECK_INTERVAL_SECONDS = 1.0  # how often get() stats the file for outside edits
+
+
+class ConfigService:
+    """config.json kept in memory.
+
+    get() serves the cached copy and re-stats the file at most once per
+    check_interval, reloading only when its mtime/size/inode changed. set()
+    writes a temp file and renames it over the original so readers never see
+    a partial file. Subscribers are called with (old, new) whenever the value
+    changes, whether through set() or an edit on disk.
+    """
+
+    def __init__(self, path=CONFIG_FILE, check_interval=CONFIG_CHECK_INTERVAL_SECONDS):
+        self.path = path
+        self.check_interval = check_interval
+        self._config = None
+        self._stamp = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self.stats = {"reads": 0, "reloads": 0, "writes": 0, "errors": 0}
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _load(self):
+        """Read the file; keeps the last good value if it is unparsable, until it changes again"""
+        stamp = self._file_stamp()
+        if stamp is None:
+            return dict(DEFAULT_CONFIG), None
+        try:
+            with open(self.path, "r") as f:
+                return {**DEFAULT_CONFIG, **json.load(f)}, stamp
+        except (OSError, ValueError) as e:
+            self.stats["errors"] += 1
+            print(f"[Config] ❌ Could not read {self.path}: {e}")
+            return (self._config or dict(DEFAULT_CONFIG)), stamp
+
+    def get(self):
+        self.stats["reads"] += 1
+        now = time.monotonic()
+        if self._config is not None and now - self._checked < self.check_interval:
+            return dict(self._config)
+
+        with self._lock:
+            old = self._config
+            if old is None or self._file_stamp() != self._stamp:
+                self._config, self._stamp = self._load()
+                self.stats["reloads"] += 1
+            self._checked = now
+            new = self._config
+        if old is not None and new != old:
+            self._notify(old, new)
+        return dict(new)
+
+    def set(self, config):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with self._lock:
+            old = self._config
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".config-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(config, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                try:
+                    os.chmod(tmp_path, os.stat(self.path).st_mode & 0o777)
+                except FileNotFoundError:
+                    os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+            self._config = dict(config)
+            self._stamp = self._file_stamp()
+            self._checked = time.monotonic()
+            self.stats["writes"] += 1
+        if config != old:
+            self._notify(old, dict(config))
+
+    def subscribe(self, callback):
+        """callback(old, new) runs in whichever thread noticed the change, so keep it short"""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _notify(self, old, new):
+        for callback in list(self._subscribers):
+            try:
+                callback(old, new)
+            except Exception as e:
+                print(f"[Config] ❌ Subscriber failed: {e}")
+
+
+config_service = ConfigService()
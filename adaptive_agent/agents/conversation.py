@@ -0,0 +1,233 @@
+import os
+import threading
+from collections import OrderedDict
+from agents.database import get_db_connection, log_agent_action  # type: ignore
+from agents.metrics import span  # type: ignore
+
+CHAT_HISTORY_PAGE_SIZE = 50
+CHAT_HISTORY_MAX_PAGE = 200
+CHAT_CONTEXT_TURNS = int(os.getenv("CHAT_CONTEXT_TURNS", "8"))              # recent turns sent verbatim
+CHAT_CONTEXT_MAX_TOKENS = int(os.getenv("CHAT_CONTEXT_MAX_TOKENS", "1500"))  # summary + turns, estimated
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "300"))
+CHAT_SUMMARY_FOLD_LIMIT = 200    # older turns read per summary update; anything earlier would be trimmed anyway
+CHAT_SUMMARY_CACHE_ENTRIES = 256
+CHAT_HISTORY_KEEP = int(os.getenv("CHAT_HISTORY_KEEP", "500"))                  # live turns kept per user
+CHAT_ARCHIVE_RETENTION_DAYS = int(os.getenv("CHAT_ARCHIVE_RETENTION_DAYS", "365"))  # 0 keeps the archive forever
+SUMMARY_LINE_CHARS = 120
+
+CHAT_SYSTEM_PROMPT = (
+    "You are a research assistant. You can find recent arXiv papers, analyze keyword trends "
+    "and write research proposals. Answer briefly and suggest one of those when it helps."
+)
+
+_summaries = OrderedDict()       # user_id -> (through_id, summary)
+_summary_lock = threading.Lock()
+context_stats = {"builds": 0, "summary_hits": 0, "summary_updates": 0, "turns_folded": 0, "turns_dropped": 0}
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token); close enough for budgeting prompts"""
+    return len(text) // 4 + 1
+
+
+# === History ===
+
+def _history_rows(conn, table, user_id, before_id, count):
+    return conn.execute(
+        f"SELECT id, message, is_user, timestamp FROM {table} WHERE user_id=? AND id < ? ORDER BY id DESC LIMIT ?",
+        (user_id, before_id, count)
+    ).fetchall()
+
+
+@span("db_read")
+def get_chat_history(user_id, before_id=None, limit=CHAT_HISTORY_PAGE_SIZE):
+    """One page of a user's messages, newest first, keyset-paginated on (user_id, id).
+
+    Pass the returned next_before_id back as before_id for the next page.
+    compact_chat_history archives a user's oldest turns, so archived ids are
+    all below the live ones: a page that runs past the live table is filled
+    from chat_history_archive, and has_more covers both.
+    """
+    limit = max(1, min(int(limit), CHAT_HISTORY_MAX_PAGE))
+    before_id = before_id if before_id is not None else 2 ** 63 - 1
+    conn = get_db_connection()
+    try:
+        rows = _history_rows(conn, "chat_history", user_id, before_id, limit + 1)
+        if len(rows) <= limit:
+            bound = rows[-1]["id"] if rows else before_id
+            rows += _history_rows(conn, "chat_history_archive", user_id, bound, limit + 1 - len(rows))
+    finally:
+        conn.close()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "messages": [
+            {"id": row["id"], "message": row["message"], "is_user": bool(row["is_user"]), "timestamp": row["timestamp"]}
+            for row in rows
+        ],
+        "next_before_id": rows[-1]["id"] if has_more else None,
+        "has_more": has_more,
+    }
+
+
+# === Rolling summary ===
+
+def _summary_line(message, is_user):
+    first_line = message.strip().split("\n", 1)[0]
+    if len(first_line) > SUMMARY_LINE_CHARS:
+        first_line = first_line[:SUMMARY_LINE_CHARS - 1] + "…"
+    return f"- {'User' if is_user else 'Assistant'}: {first_line}"
+
+
+def fold_summary(summary, turns, max_tokens=CHAT_SUMMARY_MAX_TOKENS):
+    """Append one line per turn and drop the oldest lines until the summary fits max_tokens.
+
+    Deliberately extractive: an LLM-written summary would add a model call to
+    every long conversation, which is the latency this is meant to bound.
+    """
+    lines = summary.split("\n") if summary else []
+    lines.extend(_summary_line(row["message"], row["is_user"]) for row in turns)
+    total = sum(estimate_tokens(line) for line in lines)
+    start = 0
+    while start < len(lines) and total > max_tokens:
+        total -= estimate_tokens(lines[start])
+        start += 1
+    return "\n".join(lines[start:])
+
+
+def _cached_summary(conn, user_id):
+    with _summary_lock:
+        entry = _summaries.get(user_id)
+        if entry is not None:
+            _summaries.move_to_end(user_id)
+            return entry
+    row = conn.execute("SELECT through_id, summary FROM chat_summaries WHERE user_id=?", (user_id,)).fetchone()
+    return (row["through_id"], row["summary"]) if row else (0, "")
+
+
+def _remember_summary(user_id, through_id, summary):
+    with _summary_lock:
+        _summaries[user_id] = (through_id, summary)
+        _summaries.move_to_end(user_id)
+        while len(_summaries) > CHAT_SUMMARY_CACHE_ENTRIES:
+            _summaries.popitem(last=False)
+
+
+def _summary_before(conn, user_id, first_recent_id):
+    """Summary of every turn older than first_recent_id, updated incrementally and cached per user"""
+    through_id, summary = _cached_summary(conn, user_id)
+    if through_id >= first_recent_id - 1:
+        context_stats["summary_hits"] += 1
+        _remember_summary(user_id, through_id, summary)
+        return summary
+
+    rows = conn.execute(
+        "SELECT id, message, is_user FROM chat_history WHERE user_id=? AND id > ? AND id < ? ORDER BY id DESC LIMIT ?",
+        (user_id, through_id, first_recent_id, CHAT_SUMMARY_FOLD_LIMIT)
+    ).fetchall()
+    summary = fold_summary(summary, reversed(rows))
+    through_id = first_recent_id - 1
+    conn.execute(
+        "INSERT INTO chat_summaries (user_id, through_id, summary, updated_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP) "
+        "ON CONFLICT(user_id) DO UPDATE SET through_id=excluded.through_id, summary=excluded.summary, "
+        "updated_at=excluded.updated_at WHERE excluded.through_id > chat_summaries.through_id",
+        (user_id, through_id, summary)
+    )
+    conn.commit()
+    context_stats["summary_updates"] += 1
+    context_stats["turns_folded"] += len(rows)
+    _remember_summary(user_id, through_id, summary)
+    return summary
+
+
+# === Context ===
+
+@span("chat_context")
+def build_context(user_id, turns=CHAT_CONTEXT_TURNS, max_tokens=CHAT_CONTEXT_MAX_TOKENS):
+    """LLM messages for a user's conversation: system prompt with the rolling summary, then the last turns.
+
+    Reads at most `turns` rows plus whatever the summary has not folded in yet,
+    so the cost stays flat however long the conversation is. Older recent turns
+    are dropped, and an oversized latest turn is truncated, to stay under max_tokens.
+    """
+    conn = get_db_connection()
+    try:
+        recent = conn.execute(
+            "SELECT id, message, is_user FROM chat_history WHERE user_id=? ORDER BY id DESC LIMIT ?",
+            (user_id, turns)
+        ).fetchall()
+        recent.reverse()
+        summary = _summary_before(conn, user_id, recent[0]["id"]) if recent else ""
+    finally:
+        conn.close()
+
+    system = CHAT_SYSTEM_PROMPT
+    if summary and estimate_tokens(summary) > max_tokens // 2:
+        summary = fold_summary(summary, [], max_tokens // 2)   # a small cap still leaves room for the turns
+    if summary:
+        system += "\n\nEarlier in this conversation:\n" + summary
+    budget = max_tokens - estimate_tokens(system)
+    messages = []
+    for index, row in enumerate(reversed(recent)):
+        text = row["message"]
+        cost = estimate_tokens(text)
+        if cost > budget:
+            if messages:
+                context_stats["turns_dropped"] += len(recent) - index
+                break
+            text = text[-max(budget - 1, 1) * 4:]   # the newest turn always goes in, cut to what fits
+            cost = estimate_tokens(text)
+        budget -= cost
+        messages.append(("human" if row["is_user"] else "ai", text))
+    messages.append(("system", system))
+    messages.reverse()
+
+    context_stats["builds"] += 1
+    return {"messages": messages, "tokens": max_tokens - budget, "turns": len(messages) - 1}
+
+
+def get_context_stats():
+    return {**context_stats, "cached_summaries": len(_summaries)}
+
+
+# === Archival ===
+
+@span("db_write")
+def compact_chat_history(keep=CHAT_HISTORY_KEEP, retention_days=CHAT_ARCHIVE_RETENTION_DAYS):
+    """Move all but each user's newest `keep` turns to chat_history_archive and prune old archived turns.
+
+    Archived rows keep their ids, so get_chat_history pages on into the archive.
+    """
+    conn = get_db_connection()
+    moved = pruned = 0
+    try:
+        users = conn.execute(
+            "SELECT user_id FROM chat_history GROUP BY user_id HAVING COUNT(*) > ?", (keep,)
+        ).fetchall()
+        for user in users:
+            cutoff = conn.execute(
+                "SELECT id FROM chat_history WHERE user_id=? ORDER BY id DESC LIMIT 1 OFFSET ?",
+                (user["user_id"], keep)
+            ).fetchone()
+            if cutoff is None:
+                continue
+            conn.execute(
+                "INSERT INTO chat_history_archive (id, user_id, message, is_user, timestamp) "
+                "SELECT id, user_id, message, is_user, timestamp FROM chat_history WHERE user_id=? AND id <= ?",
+                (user["user_id"], cutoff["id"])
+            )
+            moved += conn.execute(
+                "DELETE FROM chat_history WHERE user_id=? AND id <= ?", (user["user_id"], cutoff["id"])
+            ).rowcount
+            conn.commit()   # one user per transaction keeps the write lock short
+        if retention_days > 0:
+            pruned = conn.execute(
+                "DELETE FROM chat_history_archive WHERE timestamp < datetime('now', ?)", (f"-{retention_days} days",)
+            ).rowcount
+            conn.commit()
+    finally:
+        conn.close()
+    if moved or pruned:
+        print(f"[Chat] ✅ Archived {moved} messages, pruned {pruned} archived messages")
+        log_agent_action("conversation", "compact", {"archived": moved, "pruned": pruned, "users": len(users)})
+    return {"archived": moved, "pruned": pruned, "users": len(users)}
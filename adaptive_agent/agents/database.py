@@ -1,15 +1,131 @@
+import asyncio
+import contextvars
+import functools
 import json
+import queue
 import sqlite3
-import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from agents.metrics import span  # type: ignore
 
 DB_PATH = "data.db"
 
-def init_db():
-    """Initialize the database with all required tables"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
+# === Connection Pool ===
+
+DB_POOL_SIZE = 8
+DB_POOL_TIMEOUT_SECONDS = 10
+DB_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",   # safe with WAL, avoids an fsync per commit
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",    # 16 MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=134217728",
+)
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to the pool instead of closing it"""
+
+    pool = None
+
+    checked_out = False
+
+    def close(self):
+        if self.pool is None:
+            return super().close()
+        if not self.checked_out:
+            return
+        if self.in_transaction:
+            self.rollback()
+        self.checked_out = False
+        self.pool.release(self)
+
+    def discard(self):
+        super().close()
+
+
+class ConnectionPool:
+    """Bounded pool of WAL-mode connections shared across threads"""
+
+    def __init__(self, path, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT_SECONDS):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path, factory=PooledConnection, check_same_thread=False, cached_statements=256
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        for pragma in DB_PRAGMAS:
+            conn.execute(pragma)
+        conn.pool = self
+        return conn
+
+    def acquire(self):
+        conn = self._checkout()
+        conn.checked_out = True
+        return conn
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"No database connection available after {self.timeout}s")
+
+    def release(self, conn):
+        self._idle.put(conn)
+
+    def close_all(self):
+        """Close idle connections; called at shutdown once nothing else will query"""
+        while True:
+            try:
+                self._idle.get_nowait().discard()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None or _pool.path != DB_PATH:
+        with _pool_lock:
+            if _pool is None or _pool.path != DB_PATH:
+                _pool = ConnectionPool(DB_PATH)
+    return _pool
+
+# === Schema Migrations ===
+
+def create_schema(cursor):
+    """Schema v1: every table and index, created if missing, so it also adopts databases made before versioning"""
     # User authentication table
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS users (
@@ -84,71 +200,515 @@ def init_db():
     )
     """)
     
-    conn.commit()
-    conn.close()
+    # Incremental keyword index: papers already counted, per-day and all-time term counts
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS indexed_papers (
+        topic TEXT NOT NULL,
+        link TEXT NOT NULL,
+        published TEXT NOT NULL,
+        PRIMARY KEY (topic, link)
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS term_counts (
+        topic TEXT NOT NULL,
+        day TEXT NOT NULL,
+        term TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (topic, day, term)
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS term_totals (
+        topic TEXT NOT NULL,
+        term TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (topic, term)
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_term_totals_rank ON term_totals(topic, count DESC)")
+    
+    # Week/month trend aggregates: papers per bucket and per-bucket document frequency of each term
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS trend_buckets (
+        topic TEXT NOT NULL,
+        granularity TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        papers INTEGER NOT NULL,
+        PRIMARY KEY (topic, granularity, bucket)
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS term_buckets (
+        topic TEXT NOT NULL,
+        granularity TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        term TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (topic, granularity, bucket, term)
+    )
+    """)
+    
+    # LLM generation cache keyed by (model, prompt template, normalized keywords)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        cache_key TEXT PRIMARY KEY,
+        model TEXT NOT NULL,
+        prompt_hash TEXT NOT NULL,
+        keywords TEXT NOT NULL,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL,
+        hits INTEGER DEFAULT 0
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used)")
+    
+    # Named leases for leader election and cross-worker refresh locks (see agents/leader.py)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        acquired_at REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        info TEXT
+    )
+    """)
+    
+    # Indexes for the real query shapes
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_proposals_user ON proposals(user_id, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_paper_cache_topic ON paper_cache(topic, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_agent_logs_time ON agent_logs(timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_agent_logs_agent ON agent_logs(agent_name, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_agent_messages_pending ON agent_messages(message_type, processed)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_agent_messages_latest ON agent_messages(message_type, receiver, id)")
+    
+    create_search_index(cursor)
+
+# Full-text indexes over paper_cache and proposals: external-content FTS5 tables
+# that store only the index, kept in sync with their base tables by triggers
+FTS_TABLES = {
+    "paper_fts": ("paper_cache", ("title", "summary")),
+    "proposal_fts": ("proposals", ("topic", "proposal_text")),
+}
+
+def create_search_index(cursor):
+    for fts_table, (table, columns) in FTS_TABLES.items():
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (fts_table,)
+        ).fetchone()
+        cols = ", ".join(columns)
+        new_cols = ", ".join(f"new.{c}" for c in columns)
+        old_cols = ", ".join(f"old.{c}" for c in columns)
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+            f"{cols}, content='{table}', content_rowid='id', tokenize='porter unicode61')"
+        )
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_cols});
+        END
+        """)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+        END
+        """)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF {cols} ON {table} BEGIN
+            INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_cols});
+        END
+        """)
+        if not exists:
+            # Index rows written before the search index existed
+            cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
 
 def get_db_connection():
-    """Get a database connection with row factory"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row 
-    return conn
+    """Get a pooled database connection with row factory; close() returns it to the pool"""
+    return get_pool().acquire()
+
+# === Agent Activity Logging ===
+
+class AgentLogWriter:
+    """Bounded in-memory queue of agent log events, batch-inserted by a background thread.
+
+    A flush happens when batch_size events are waiting or flush_interval seconds
+    have passed, whichever comes first. When the queue is full, log() drops the
+    event instead of waiting, since it is called from the event loop.
+    """
+
+    def __init__(self, max_queue=10000, batch_size=200, flush_interval=1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()  # log() callers and the writer thread both count
+        self.stats = {"logged": 0, "written": 0, "dropped": 0, "flushes": 0, "errors": 0}
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for key, n in increments.items():
+                self.stats[key] += n
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="agent-log-writer", daemon=True)
+                self._thread.start()
+
+    def log(self, agent_name: str, action_type: str, data: dict):
+        event = (agent_name, action_type, json.dumps(data, default=str),
+                 datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"))
+        if self._stop.is_set():
+            # Stopped for shutdown: a new daemon writer would lose whatever it queued at exit
+            self._write([event])
+            self._count(logged=1)
+            return
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(event)
+            self._count(logged=1)
+        except queue.Full:
+            self._count(dropped=1)
+
+    def _next_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            conn = get_db_connection()
+            try:
+                conn.executemany(
+                    "INSERT INTO agent_logs (agent_name, action_type, data, timestamp) VALUES (?, ?, ?, ?)",
+                    batch
+                )
+                conn.commit()
+            finally:
+                conn.close()
+            self._count(written=len(batch), flushes=1)
+        except Exception as e:
+            self._count(errors=1, dropped=len(batch))
+            print(f"[Agent Log] ❌ Failed to write {len(batch)} events: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+        self.flush()
+
+    def flush(self):
+        """Write everything queued so far from the calling thread"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {**stats, "queued": self._queue.qsize()}
+
+
+agent_logger = AgentLogWriter()
 
 def log_agent_action(agent_name: str, action_type: str, data: dict):
-    """Log agent activities to database"""
+    """Log agent activities to database (queued, written in batches)"""
+    agent_logger.log(agent_name, action_type, data)
+
+def get_agent_logs(agent_name: str = None, action_type: str = None, before_id: int = None, limit: int = 100):
+    """Most recent agent log entries, newest first, with keyset pagination on id"""
+    clauses, params = [], []
+    if agent_name:
+        clauses.append("agent_name=?")
+        params.append(agent_name)
+    if action_type:
+        clauses.append("action_type=?")
+        params.append(action_type)
+    if before_id:
+        clauses.append("id < ?")
+        params.append(before_id)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
     conn = get_db_connection()
     try:
-        conn.execute(
-            "INSERT INTO agent_logs (agent_name, action_type, data) VALUES (?, ?, ?)",
-            (agent_name, action_type, json.dumps(data))
+        cursor = conn.execute(
+            f"SELECT id, agent_name, action_type, data, timestamp FROM agent_logs {where} ORDER BY id DESC LIMIT ?",
+            (*params, limit)
         )
-        conn.commit()
+        return [
+            {"id": r["id"], "agent_name": r["agent_name"], "action_type": r["action_type"],
+             "data": json.loads(r["data"]), "timestamp": r["timestamp"]}
+            for r in cursor.fetchall()
+        ]
     finally:
         conn.close()
 
+_user_ids = {}
+
 def get_user_id(username: str) -> int:
-    """Get user ID from username"""
+    """Get user ID from username (cached, user ids never change)"""
+    if username in _user_ids:
+        return _user_ids[username]
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
         cursor.execute("SELECT id FROM users WHERE username=?", (username,))
         result = cursor.fetchone()
-        return result['id'] if result else None
     finally:
         conn.close()
-def migrate_existing_data():
-    """Migration function for existing users"""
+    if result:
+        _user_ids[username] = result['id']
+        return result['id']
+    return None
+
+@span("db_write")
+def save_chat_message(username: str, message: str, is_user: bool):
+    """Append one chat turn to chat_history"""
+    user_id = get_user_id(username)
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            "INSERT INTO chat_history (user_id, message, is_user) VALUES (?, ?, ?)",
+            (user_id, message, int(is_user))
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+@span("db_write")
+def save_proposal(username: str, topic: str, keywords, proposal_text: str) -> int:
+    """Store a generated proposal and return its id"""
+    user_id = get_user_id(username)
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        
-        cursor.execute("PRAGMA table_info(users)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'created_at' not in columns:
-            cursor.execute("ALTER TABLE users ADD COLUMN created_at DATETIME")
-            cursor.execute("UPDATE users SET created_at = datetime('now')")
-            
-
-            cursor.execute("""
-                CREATE TABLE users_new (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password TEXT NOT NULL,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            cursor.execute("""
-                INSERT INTO users_new (id, username, password, created_at)
-                SELECT id, username, password, created_at FROM users
-            """)
-            cursor.execute("DROP TABLE users")
-            cursor.execute("ALTER TABLE users_new RENAME TO users")
-            
+        cursor.execute(
+            "INSERT INTO proposals (user_id, topic, keywords, proposal_text) VALUES (?, ?, ?, ?)",
+            (user_id, topic, json.dumps(keywords), proposal_text)
+        )
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+@span("db_write")
+def save_proposals(username: str, rows) -> list:
+    """Store many (topic, keywords, proposal_text) rows in one transaction and return their ids"""
+    user_id = get_user_id(username)
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        ids = []
+        for topic, keywords, proposal_text in rows:
+            cursor.execute(
+                "INSERT INTO proposals (user_id, topic, keywords, proposal_text) VALUES (?, ?, ?, ?)",
+                (user_id, topic, json.dumps(keywords), proposal_text)
+            )
+            ids.append(cursor.lastrowid)
+        conn.commit()
+        return ids
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+# === Async Facade ===
+
+_db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+
+def _execute(sql, params):
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(sql, params)
         conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+async def run_db(func, *args):
+    """Run a blocking database function on the dedicated DB executor"""
+    # Carry context variables over like asyncio.to_thread does, so spans are attributed to the request
+    call = functools.partial(contextvars.copy_context().run, func, *args)
+    return await asyncio.get_running_loop().run_in_executor(_db_executor, call)
+
+async def db_execute(sql: str, params=()):
+    """Execute a write statement off the event loop; returns lastrowid"""
+    return await run_db(_execute, sql, params)
+
+def add_users_created_at(cursor):
+    """Schema v2: users tables from before created_at existed get the column"""
+    cursor.execute("PRAGMA table_info(users)")
+    columns = [column[1] for column in cursor.fetchall()]
+    
+    if 'created_at' not in columns:
+        cursor.execute("ALTER TABLE users ADD COLUMN created_at DATETIME")
+        cursor.execute("UPDATE users SET created_at = datetime('now')")
+        
+
+        cursor.execute("""
+            CREATE TABLE users_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password TEXT NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            INSERT INTO users_new (id, username, password, created_at)
+            SELECT id, username, password, created_at FROM users
+        """)
+        cursor.execute("DROP TABLE users")
+        cursor.execute("ALTER TABLE users_new RENAME TO users")
+
+def add_chat_archive(cursor):
+    """Keyset index for chat history pages, the archive compaction moves old turns to, and per-user summaries"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_user ON chat_history(user_id, id)")
+    # Nothing filters chat_history by timestamp; (user_id, id) serves every query. Databases
+    # created before schema versioning may still carry this index from the old create_schema
+    cursor.execute("DROP INDEX IF EXISTS idx_chat_history_user_time")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS chat_history_archive (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        message TEXT NOT NULL,
+        is_user BOOLEAN NOT NULL,
+        timestamp DATETIME,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_archive_user ON chat_history_archive(user_id, id)")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS chat_summaries (
+        user_id INTEGER PRIMARY KEY,
+        through_id INTEGER NOT NULL,
+        summary TEXT NOT NULL,
+        updated_at DATETIME,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+
+def add_paper_cache_fetches(cursor):
+    """Per-topic record of how many results paper_cache holds a fetch for; seeded from the rows already cached"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS paper_cache_fetches (
+        topic TEXT PRIMARY KEY,
+        requested INTEGER NOT NULL,
+        fetched_at REAL NOT NULL
+    )
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO paper_cache_fetches (topic, requested, fetched_at)
+        SELECT topic, COUNT(*), MIN(CAST(strftime('%s', timestamp) AS INTEGER)) FROM paper_cache GROUP BY topic
+    """)
+
+def add_batch_jobs(cursor):
+    """Batch job state and event log, so any worker can report on a job another worker is running"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS batch_jobs (
+        id TEXT PRIMARY KEY,
+        username TEXT NOT NULL,
+        topics TEXT NOT NULL,
+        max_results INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        error TEXT,
+        results TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        finished_at REAL
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_batch_jobs_user ON batch_jobs(username, finished_at)")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS batch_job_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id TEXT NOT NULL,
+        event TEXT NOT NULL
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_batch_job_events_job ON batch_job_events(job_id, id)")
+
+def add_paper_duplicates(cursor):
+    """Near-duplicate papers found by the similarity index, so a rebuild from paper_cache skips them again"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS paper_duplicates (
+        link TEXT PRIMARY KEY,
+        duplicate_of TEXT NOT NULL
+    )
+    """)
+
+# Applied in order; PRAGMA user_version records the last one that ran. Append, never edit.
+MIGRATIONS = [
+    (1, create_schema),
+    (2, add_users_created_at),
+    (3, add_chat_archive),
+    (4, add_paper_cache_fetches),
+    (5, add_batch_jobs),
+    (6, add_paper_duplicates),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def schema_version():
+    conn = get_db_connection()
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
     finally:
         conn.close()
 
-if not os.path.exists(DB_PATH):
-    init_db()
-else:
-    migrate_existing_data()
\ No newline at end of file
+def init_db():
+    """Bring the schema up to SCHEMA_VERSION and return the version; a single PRAGMA read once it is current.
+
+    Pending migrations run in one BEGIN IMMEDIATE transaction, so when several
+    workers start together one of them migrates while the others wait, then
+    re-read the version and find nothing left to do.
+    """
+    conn = get_db_connection()
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return version
+        conn.execute("BEGIN IMMEDIATE")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        cursor = conn.cursor()
+        applied = []
+        for number, migration in MIGRATIONS:
+            if number > version:
+                migration(cursor)
+                applied.append(number)
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    finally:
+        conn.close()
+    if applied:
+        print(f"[DB] ✅ Migrated schema from v{version} to v{SCHEMA_VERSION}")
+        log_agent_action("database", "migrate", {"from": version, "to": SCHEMA_VERSION, "applied": applied})
+    return SCHEMA_VERSION
\ No newline at end of file
@@ -1,96 +1,734 @@
+import asyncio
+import hashlib
+import json
 import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
 from typing import List
 from agents.message_bus import bus  # type: ignore 
-from langchain_groq import ChatGroq  # type: ignore
-from langchain_core.prompts import ChatPromptTemplate  # type: ignore
+from agents.database import get_db_connection, log_agent_action  # type: ignore
+from agents.metrics import span  # type: ignore
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-if not GROQ_API_KEY:
-    raise ValueError("GROQ_API_KEY environment variable is missing")
+MODEL_NAME = "llama-3.3-70b-versatile"
+LLM_PRELOAD = os.getenv("LLM_PRELOAD", "0") == "1"  # build the client at startup instead of on first use
 
-llm = ChatGroq(
-    groq_api_key=GROQ_API_KEY,
-    model_name="llama-3.3-70b-versatile",
-    temperature=0,
-)
-
-proposal_prompt = ChatPromptTemplate.from_template("""
+PROPOSAL_TEMPLATE = """
 You are an AI research assistant. Generate a detailed research proposal using these keywords:
 
 Keywords: {keywords}
                                   
 Write a concise but informative research proposal incorporating these keywords.
-""")
-def generate_research_idea(keywords: List[str]) -> str:
-    if not keywords:
-        return "❌ No keywords provided."
+"""
+
+# LangChain and the Groq SDK take most of this module's import cost, so nothing
+# from them is imported until a proposal is actually generated
+llm = None               # set by get_llm(); may be replaced with any client that has invoke/ainvoke/astream
+proposal_prompt = None
+_llm_lock = threading.Lock()
+
+
+def get_llm():
+    """The shared ChatGroq client (and proposal prompt), created on first use"""
+    global llm, proposal_prompt
+    if llm is None or proposal_prompt is None:
+        with _llm_lock:
+            if proposal_prompt is None:
+                from langchain_core.prompts import ChatPromptTemplate  # type: ignore
+                proposal_prompt = ChatPromptTemplate.from_template(PROPOSAL_TEMPLATE)
+            if llm is None:
+                api_key = os.getenv("GROQ_API_KEY")
+                if not api_key:
+                    raise ValueError("GROQ_API_KEY environment variable is missing")
+                from langchain_groq import ChatGroq  # type: ignore
+                llm = ChatGroq(groq_api_key=api_key, model_name=MODEL_NAME, temperature=0)
+    return llm
+
+
+async def aget_llm():
+    """get_llm() without blocking the event loop on the first, import-heavy call"""
+    if llm is not None and proposal_prompt is not None:
+        return llm
+    return await asyncio.to_thread(get_llm)
+
 
-    keywords_str = ", ".join(keywords)
-    prompt_input = {"keywords": keywords_str}
+def proposal_messages(keywords):
+    """Prompt messages for a list of normalized keywords; call get_llm() first"""
+    return proposal_prompt.format_prompt(keywords=", ".join(keywords)).to_messages()
 
+# === Generation Cache ===
+
+LLM_CACHE_TTL_SECONDS = 7 * 86400
+LLM_CACHE_MAX_ENTRIES = 1000
+PROMPT_HASH = hashlib.sha256(PROPOSAL_TEMPLATE.encode("utf-8")).hexdigest()[:16]
+
+llm_cache_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def normalize_keywords(keywords):
+    """Lowercased, deduplicated, sorted keywords; accepts plain strings or (keyword, count) pairs"""
+    words = {(kw[0] if isinstance(kw, (list, tuple)) else kw).strip().lower() for kw in keywords}
+    return sorted(w for w in words if w)
+
+
+def _llm_cache_key(keywords):
+    return hashlib.sha256(f"{MODEL_NAME}|{PROMPT_HASH}|{','.join(keywords)}".encode("utf-8")).hexdigest()
+
+
+@span("llm_cache_read")
+def _cache_lookup(cache_key):
+    conn = get_db_connection()
     try:
-        result = llm.invoke(proposal_prompt.format_prompt(**prompt_input).to_messages())
-
-        if isinstance(result, list) and result and hasattr(result[0], "content"):
-            return result[0].content.strip()
-        elif hasattr(result, "content"):
-            return result.content.strip()
-        elif isinstance(result, str) and result.strip():
-            return result.strip()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT response FROM llm_cache WHERE cache_key=? AND created_at > ? AND TRIM(response) != ''",
+            (cache_key, time.time() - LLM_CACHE_TTL_SECONDS)
+        )
+        row = cursor.fetchone()
+        if row:
+            cursor.execute(
+                "UPDATE llm_cache SET last_used=?, hits=hits+1 WHERE cache_key=?",
+                (time.time(), cache_key)
+            )
+            conn.commit()
+        return row["response"] if row else None
+    finally:
+        conn.close()
+
+
+def _cache_store(conn, cache_key, keywords, response, created_at=None):
+    now = time.time()
+    conn.execute(
+        "INSERT OR REPLACE INTO llm_cache (cache_key, model, prompt_hash, keywords, response, created_at, last_used, hits) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+        (cache_key, MODEL_NAME, PROMPT_HASH, json.dumps(keywords), response, created_at or now, now)
+    )
+
+
+def _evict(conn):
+    """Drop expired entries, then least recently used ones beyond the size bound"""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM llm_cache WHERE created_at <= ?", (time.time() - LLM_CACHE_TTL_SECONDS,))
+    evicted = cursor.rowcount
+    cursor.execute(
+        "DELETE FROM llm_cache WHERE cache_key IN ("
+        "SELECT cache_key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+        (LLM_CACHE_MAX_ENTRIES,)
+    )
+    llm_cache_stats["evictions"] += evicted + cursor.rowcount
+
+
+def cache_response(keywords, response):
+    conn = get_db_connection()
+    try:
+        _cache_store(conn, _llm_cache_key(keywords), keywords, response)
+        _evict(conn)
+        conn.commit()
+        llm_cache_stats["stores"] += 1
+    finally:
+        conn.close()
+
+
+def warm_llm_cache_from_proposals():
+    """Seed the cache from previously generated proposals; returns how many entries were added"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT keywords, proposal_text, strftime('%s', timestamp) AS created_at FROM proposals "
+            "WHERE timestamp > datetime('now', ?) AND TRIM(COALESCE(proposal_text, '')) != '' ORDER BY id",
+            (f"-{LLM_CACHE_TTL_SECONDS} seconds",)
+        )
+        added = 0
+        for row in cursor.fetchall():
+            if row["proposal_text"].startswith("❌"):
+                continue
+            keywords = normalize_keywords(json.loads(row["keywords"]))
+            if not keywords:
+                continue
+            cache_key = _llm_cache_key(keywords)
+            exists = conn.execute("SELECT 1 FROM llm_cache WHERE cache_key=?", (cache_key,)).fetchone()
+            if not exists:
+                _cache_store(conn, cache_key, keywords, row["proposal_text"], float(row["created_at"]))
+                added += 1
+        _evict(conn)
+        conn.commit()
+        return added
+    finally:
+        conn.close()
+
+
+def get_llm_cache_stats():
+    lookups = llm_cache_stats["hits"] + llm_cache_stats["misses"]
+    return {**llm_cache_stats, "hit_rate": round(llm_cache_stats["hits"] / lookups, 3) if lookups else 0.0}
+
+
+# === LLM Gateway ===
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_MAX_QUEUE_PER_USER = int(os.getenv("LLM_MAX_QUEUE_PER_USER", "4"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "30"))
+LLM_RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", "30"))  # 0 disables rate limiting
+LLM_BURST = int(os.getenv("LLM_BURST", "5"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+
+
+class LLMGatewayError(Exception):
+    """An LLM call was not admitted: 429 for a user over their queue share, 503 when the gateway is saturated"""
+
+    def __init__(self, message, status_code, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills rate tokens per second up to capacity; callers hold the gateway lock"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self):
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def time_until_token(self):
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class _Ticket:
+    __slots__ = ("user", "enqueued_at", "event", "loop", "future", "granted")
+
+    def __init__(self, user, event=None, loop=None, future=None):
+        self.user = user
+        self.enqueued_at = time.perf_counter()
+        self.event = event
+        self.loop = loop
+        self.future = future
+        self.granted = False
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class LLMGateway:
+    """Admission control for LLM calls.
+
+    At most max_concurrency calls run at once and starts are paced by a token
+    bucket. Callers that cannot start immediately wait in per-user FIFO queues
+    served round-robin, so one busy user cannot starve the rest. A full queue
+    is rejected straight away and a caller still queued after queue_timeout
+    gives up with a 503, so request threads never pile up behind the provider.
+    Usable from threads (slot) and from async code (aslot).
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, max_queue=LLM_MAX_QUEUE,
+                 max_queue_per_user=LLM_MAX_QUEUE_PER_USER, queue_timeout=LLM_QUEUE_TIMEOUT_SECONDS,
+                 rate_per_minute=LLM_RATE_PER_MINUTE, burst=LLM_BURST):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.queue_timeout = queue_timeout
+        self.bucket = TokenBucket(rate_per_minute / 60, burst) if rate_per_minute > 0 else None
+        self.active = 0
+        self._queues = OrderedDict()  # user -> deque of waiting tickets, in round-robin order
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._timer = None
+        self.stats = {"admitted": 0, "rejected_queue_full": 0, "rejected_user_limit": 0, "timed_out": 0,
+                      "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+
+    def _submit(self, ticket):
+        with self._lock:
+            queue = self._queues.get(ticket.user)
+            if self._queued >= self.max_queue:
+                self.stats["rejected_queue_full"] += 1
+                raise LLMGatewayError("LLM queue is full, try again shortly", 503, retry_after=self.queue_timeout)
+            if queue is not None and len(queue) >= self.max_queue_per_user:
+                self.stats["rejected_user_limit"] += 1
+                raise LLMGatewayError("Too many pending LLM requests for this user", 429, retry_after=self.queue_timeout)
+            if queue is None:
+                queue = self._queues[ticket.user] = deque()
+            queue.append(ticket)
+            self._queued += 1
+            self._dispatch()
+        return ticket
+
+    def _dispatch(self):
+        """Start queued tickets while there is capacity; lock held"""
+        while self._queues and self.active < self.max_concurrency:
+            if self.bucket is not None and not self.bucket.try_take():
+                self._wake_after(self.bucket.time_until_token())
+                return
+            user, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            if queue:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            self._queued -= 1
+            self._grant(ticket)
+
+    def _grant(self, ticket):
+        ticket.granted = True
+        self.active += 1
+        wait_ms = (time.perf_counter() - ticket.enqueued_at) * 1000
+        self.stats["admitted"] += 1
+        self.stats["wait_ms_total"] += wait_ms
+        self.stats["wait_ms_max"] = max(self.stats["wait_ms_max"], wait_ms)
+        if ticket.future is not None:
+            ticket.loop.call_soon_threadsafe(_resolve, ticket.future)
         else:
-            return "❌ LLM returned an empty or unexpected result."
+            ticket.event.set()
 
-    except Exception as e:
-        return f"❌ Failed to generate proposal. Reason: {str(e)}"
+    def _wake_after(self, delay):
+        if self._timer is None:
+            self._timer = threading.Timer(delay, self._on_timer)
+            self._timer.daemon = True
+            self._timer.start()
 
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            self._dispatch()
 
-import re
-def format_innovation_proposal(raw_text: str) -> str:
-    emoji_headers = {
-        "Title": "💡", "Introduction": "📚", "Research Objectives": "🎯",
-        "Research Questions": "❓", "Methodology": "🧪", "Expected Outcomes": "🚀",
-        "Impact": "🌍", "Timeline": "⏳", "Personnel": "👥", "Resources": "🧰", "Conclusion": "🔚"
-    }
+    def _abandon(self, ticket, cancelled=False):
+        """Withdraw a waiting ticket; returns True if it was granted in the meantime and is kept"""
+        with self._lock:
+            if ticket.granted:
+                if not cancelled:
+                    return True
+                self.active -= 1
+                self._dispatch()
+                return False
+            queue = self._queues[ticket.user]
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.user]
+            self._queued -= 1
+            if not cancelled:
+                self.stats["timed_out"] += 1
+            return False
 
-    lines = raw_text.split("\n")
-    formatted = []
-    for line in lines:
-        line = line.strip()
-        if not line:
+    def release(self):
+        with self._lock:
+            self.active -= 1
+            self._dispatch()
+
+    @span("llm_queue_wait")
+    def acquire(self, user=None):
+        ticket = self._submit(_Ticket(user, event=threading.Event()))
+        if not ticket.event.wait(self.queue_timeout) and not self._abandon(ticket):
+            raise LLMGatewayError("Timed out waiting for an LLM slot", 503, retry_after=self.queue_timeout)
+
+    async def aacquire(self, user=None):
+        loop = asyncio.get_running_loop()
+        ticket = self._submit(_Ticket(user, loop=loop, future=loop.create_future()))
+        with span("llm_queue_wait"):
+            try:
+                await asyncio.wait_for(asyncio.shield(ticket.future), self.queue_timeout)
+            except asyncio.TimeoutError:
+                if not self._abandon(ticket):
+                    raise LLMGatewayError("Timed out waiting for an LLM slot", 503, retry_after=self.queue_timeout)
+            except asyncio.CancelledError:
+                self._abandon(ticket, cancelled=True)
+                raise
+
+    @contextmanager
+    def slot(self, user=None):
+        self.acquire(user)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, user=None):
+        await self.aacquire(user)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_stats(self):
+        with self._lock:
+            admitted = self.stats["admitted"]
+            return {
+                "active": self.active,
+                "max_concurrency": self.max_concurrency,
+                "queued": self._queued,
+                # Counts only: these stats are exported on the unauthenticated /metrics endpoint
+                "queued_users": len(self._queues),
+                "max_queued_per_user": max((len(q) for q in self._queues.values()), default=0),
+                "tokens": round(self.bucket.tokens, 2) if self.bucket else None,
+                "admitted": admitted,
+                "rejected_queue_full": self.stats["rejected_queue_full"],
+                "rejected_user_limit": self.stats["rejected_user_limit"],
+                "timed_out": self.stats["timed_out"],
+                "avg_wait_ms": round(self.stats["wait_ms_total"] / admitted, 1) if admitted else 0.0,
+                "max_wait_ms": round(self.stats["wait_ms_max"], 1),
+            }
+
+
+llm_gateway = LLMGateway()
+
+
+def _result_text(result):
+    """Text content of an LLM result, or None if it is empty or unexpected"""
+    if isinstance(result, list) and result and hasattr(result[0], "content"):
+        return result[0].content.strip()
+    if hasattr(result, "content"):
+        return result.content.strip()
+    if isinstance(result, str) and result.strip():
+        return result.strip()
+    return None
+
+
+def generate_research_idea(keywords: List[str], use_cache: bool = True, user: str = None) -> str:
+    keywords = normalize_keywords(keywords)
+    if not keywords:
+        return "❌ No keywords provided."
+
+    cache_key = _llm_cache_key(keywords)
+    if use_cache:
+        cached = _cache_lookup(cache_key)
+        if cached is not None:
+            llm_cache_stats["hits"] += 1
+            log_agent_action("innovation_agent", "generate", {"keywords": keywords, "cached": True})
+            return cached
+        llm_cache_stats["misses"] += 1
+
+    with llm_gateway.slot(user), span("llm_invoke"):
+        try:
+            text = _result_text(get_llm().invoke(proposal_messages(keywords)))
+        except Exception as e:
+            return f"❌ Failed to generate proposal. Reason: {str(e)}"
+    if not text:
+        return "❌ LLM returned an empty or unexpected result."
+
+    cache_response(keywords, text)
+    log_agent_action("innovation_agent", "generate", {"keywords": keywords, "cached": False, "chars": len(text)})
+    return text
+
+
+async def agenerate_research_idea(keywords: List[str], use_cache: bool = True, user: str = None,
+                                  raise_errors: bool = False) -> str:
+    """Async variant of generate_research_idea; waits for an LLM slot without holding a thread.
+
+    With raise_errors, failures raise instead of coming back as "❌" messages.
+    """
+    keywords = normalize_keywords(keywords)
+    if not keywords:
+        if raise_errors:
+            raise ValueError("No keywords provided")
+        return "❌ No keywords provided."
+
+    cache_key = _llm_cache_key(keywords)
+    if use_cache:
+        cached = await asyncio.to_thread(_cache_lookup, cache_key)
+        if cached is not None:
+            llm_cache_stats["hits"] += 1
+            log_agent_action("innovation_agent", "generate", {"keywords": keywords, "cached": True})
+            return cached
+        llm_cache_stats["misses"] += 1
+
+    async with llm_gateway.aslot(user):
+        try:
+            client = await aget_llm()
+            with span("llm_invoke"):
+                result = await client.ainvoke(proposal_messages(keywords))
+            text = _result_text(result)
+        except Exception as e:
+            if raise_errors:
+                raise
+            return f"❌ Failed to generate proposal. Reason: {str(e)}"
+    if not text:
+        if raise_errors:
+            raise ValueError("LLM returned an empty or unexpected result")
+        return "❌ LLM returned an empty or unexpected result."
+
+    await asyncio.to_thread(cache_response, keywords, text)
+    log_agent_action("innovation_agent", "generate", {"keywords": keywords, "cached": False, "chars": len(text)})
+    return text
+
+
+async def agenerate_chat_reply(messages, user: str = None):
+    """Free-form reply to a conversation built by conversation.build_context, or None if the LLM returned nothing.
+
+    Not cached: the context differs on every turn. Raises LLMGatewayError when
+    the gateway is saturated and whatever the client raises otherwise.
+    """
+    async with llm_gateway.aslot(user):
+        client = await aget_llm()
+        with span("llm_chat"):
+            result = await client.ainvoke(messages)
+    return _result_text(result)
+
+
+async def abatch_research_ideas(keyword_lists, user=None, max_concurrency=BATCH_LLM_CONCURRENCY):
+    """Yield (index, proposal) for each keyword list as soon as its proposal is ready.
+
+    Cached proposals are returned first; the rest go through LangChain's
+    abatch_as_completed with at most max_concurrency calls in flight, each
+    holding its own gateway slot. Failures come back as "❌" messages, like
+    generate_research_idea. Lists that normalize to the same keywords share one call.
+    """
+    normalized = [normalize_keywords(keywords) for keywords in keyword_lists]
+    waiting = {}  # cache key -> indexes of the lists that need it
+    for i, keywords in enumerate(normalized):
+        if not keywords:
+            yield i, "❌ No keywords provided."
             continue
-        section_match = re.match(r"\*\*(.+?):\*\*", line)
-        if section_match:
-            title = section_match.group(1)
-            emoji = emoji_headers.get(title, "")
-            if title == "Title":
-                formatted.append(f"# {emoji} Innovation Proposal: {line.replace('**Title:**', '').strip()}")
-                formatted.append("---")
-            else:
-                formatted.append(f"\n## {emoji} {title}")
+        cache_key = _llm_cache_key(keywords)
+        if cache_key in waiting:
+            waiting[cache_key].append(i)
             continue
+        cached = await asyncio.to_thread(_cache_lookup, cache_key)
+        if cached is not None:
+            llm_cache_stats["hits"] += 1
+            yield i, cached
+        else:
+            llm_cache_stats["misses"] += 1
+            waiting[cache_key] = [i]
+    if not waiting:
+        return
+    pending = list(waiting.values())
+    try:
+        client = await aget_llm()
+    except Exception as e:
+        for ids in pending:
+            for i in ids:
+                yield i, f"❌ Failed to generate proposal. Reason: {str(e)}"
+        return
+    from langchain_core.runnables import RunnableLambda  # type: ignore
+
+    async def gated_invoke(messages):
+        async with llm_gateway.aslot(user):
+            with span("llm_invoke"):
+                return await client.ainvoke(messages)
 
-        numbered = re.match(r"(\d+)\.\s*(?:\*\*(.*?)\*\*:)?\s*(.+)", line)
-        if numbered:
-            num, bold, text = numbered.groups()
-            emoji_num = {
-                "1": "1️⃣", "2": "2️⃣", "3": "3️⃣", "4": "4️⃣", "5": "5️⃣",
-                "6": "6️⃣", "7": "7️⃣", "8": "8️⃣", "9": "9️⃣"
-            }.get(num, f"{num}.")
-            if bold:
-                formatted.append(f"{emoji_num} **{bold}**: {text}")
+    inputs = [proposal_messages(normalized[ids[0]]) for ids in pending]
+    results = RunnableLambda(gated_invoke).abatch_as_completed(
+        inputs, config={"max_concurrency": max_concurrency}, return_exceptions=True
+    )
+    async for j, result in results:
+        ids = pending[j]
+        keywords = normalized[ids[0]]
+        if isinstance(result, Exception):
+            text = f"❌ Failed to generate proposal. Reason: {str(result)}"
+        else:
+            text = _result_text(result)
+            if text is None:
+                text = "❌ LLM returned an empty or unexpected result."
             else:
-                formatted.append(f"{emoji_num} {text}")
-            continue
+                if text:
+                    await asyncio.to_thread(cache_response, keywords, text)
+                log_agent_action("innovation_agent", "generate", {"keywords": keywords, "cached": False, "batch": True})
+        for i in ids:
+            yield i, text
+
+
+async def agenerate_from_bus(correlation_id=None, user=None):
+    """Generate a proposal from the keywords on the bus and publish it for downstream stages.
+
+    Raises when generation fails, so a failed proposal is never published or saved.
+    """
+    keywords = bus.consume("keywords", correlation_id)
+    if keywords is None:
+        return None
+
+    proposal = await agenerate_research_idea([kw for kw, _ in keywords], user=user, raise_errors=True)
+    bus.publish("proposal", proposal, correlation_id=correlation_id, sender="innovation_agent")
+    return proposal
+
+
+import re
+
+EMOJI_HEADERS = {
+    "Title": "💡", "Introduction": "📚", "Research Objectives": "🎯",
+    "Research Questions": "❓", "Methodology": "🧪", "Expected Outcomes": "🚀",
+    "Impact": "🌍", "Timeline": "⏳", "Personnel": "👥", "Resources": "🧰", "Conclusion": "🔚"
+}
+EMOJI_NUMBERS = {
+    "1": "1️⃣", "2": "2️⃣", "3": "3️⃣", "4": "4️⃣", "5": "5️⃣",
+    "6": "6️⃣", "7": "7️⃣", "8": "8️⃣", "9": "9️⃣"
+}
+SECTION_RE = re.compile(r"\*\*(.+?):\*\*")
+NUMBERED_RE = re.compile(r"(\d+)\.\s*(?:\*\*(.*?)\*\*:)?\s*(.+)")
 
-        formatted.append(f"- {line}")
 
+def format_proposal_line(line: str) -> List[str]:
+    """Formatted output lines for one line of raw LLM text"""
+    line = line.strip()
+    if not line:
+        return []
+    section_match = SECTION_RE.match(line)
+    if section_match:
+        title = section_match.group(1)
+        emoji = EMOJI_HEADERS.get(title, "")
+        if title == "Title":
+            return [f"# {emoji} Innovation Proposal: {line.replace('**Title:**', '').strip()}", "---"]
+        return [f"\n## {emoji} {title}"]
+
+    numbered = NUMBERED_RE.match(line)
+    if numbered:
+        num, bold, text = numbered.groups()
+        emoji_num = EMOJI_NUMBERS.get(num, f"{num}.")
+        if bold:
+            return [f"{emoji_num} **{bold}**: {text}"]
+        return [f"{emoji_num} {text}"]
+
+    return [f"- {line}"]
+
+
+@span("format")
+def format_innovation_proposal(raw_text: str) -> str:
+    formatted = []
+    for line in raw_text.split("\n"):
+        formatted.extend(format_proposal_line(line))
     return "\n".join(formatted)
-def save_proposal_as_markdown(topic, keywords, proposal_text, filename="proposal.md"):
+
+
+class ProposalStreamFormatter:
+    """Incremental format_innovation_proposal: formats each line as soon as it is complete"""
+
+    def __init__(self):
+        self._pending = ""
+        self._started = False
+
+    def _emit(self, lines):
+        formatted = [out for line in lines for out in format_proposal_line(line)]
+        if not formatted:
+            return ""
+        text = "\n".join(formatted)
+        if self._started:
+            text = "\n" + text
+        self._started = True
+        return text
+
+    def feed(self, chunk: str) -> str:
+        *complete, self._pending = (self._pending + chunk).split("\n")
+        return self._emit(complete)
+
+    def flush(self) -> str:
+        pending, self._pending = self._pending, ""
+        return self._emit([pending])
+
+
+async def astream_research_idea(keywords: List[str], user: str = None):
+    """Yield raw proposal text chunks as the LLM produces them; the full text is cached once complete"""
+    keywords = normalize_keywords(keywords)
+    if not keywords:
+        yield "❌ No keywords provided."
+        return
+
+    cache_key = _llm_cache_key(keywords)
+    cached = await asyncio.to_thread(_cache_lookup, cache_key)
+    if cached is not None:
+        llm_cache_stats["hits"] += 1
+        yield cached
+        return
+    llm_cache_stats["misses"] += 1
+
+    client = await aget_llm()
+    messages = proposal_messages(keywords)
+    parts = []
+    async with llm_gateway.aslot(user):
+        with span("llm_stream"):
+            async for chunk in client.astream(messages):
+                text = chunk.content if hasattr(chunk, "content") else str(chunk)
+                if text:
+                    parts.append(text)
+                    yield text
+
+    full_text = "".join(parts).strip()
+    if full_text:
+        await asyncio.to_thread(cache_response, keywords, full_text)
+
+
+# === Markdown Export ===
+
+def render_proposal_markdown(topic, keywords, proposal_text, timestamp=None):
     content = f"# Research Proposal: {topic}\n\n"
+    if timestamp:
+        content += f"_Generated: {timestamp}_\n\n"
     content += "## Extracted Keywords:\n"
     content += "\n".join(f"- {kw}" for kw in keywords)
     content += "\n\n## Proposal:\n"
     content += proposal_text
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write(content)
-    return filename
+    return content
+
+
+EXPORT_PAGE_SIZE = 50
+
+
+def _proposals_page(sql, params, before_id, size):
+    """One keyset page of export rows; the pooled connection is returned before anything is sent"""
+    conn = get_db_connection()
+    try:
+        return conn.execute(sql, [*params, before_id, size]).fetchall()
+    finally:
+        conn.close()
+
+
+def iter_proposals_markdown(user_id, topic=None, since=None, until=None, limit=None):
+    """Markdown for a user's proposals, newest first, read EXPORT_PAGE_SIZE rows at a time.
+
+    since/until are inclusive YYYY-MM-DD dates. Returns None when nothing
+    matches, so callers can answer 404 before they start streaming; otherwise
+    a generator of UTF-8 chunks. Pages are read by keyset on id with a
+    short-lived connection each, so a slow client never holds a pooled
+    connection while it downloads.
+    """
+    sql = "SELECT id, topic, keywords, proposal_text, timestamp FROM proposals WHERE user_id=?"
+    params = [user_id]
+    if topic:
+        sql += " AND topic=? COLLATE NOCASE"
+        params.append(topic)
+    if since:
+        sql += " AND timestamp >= ?"
+        params.append(since)
+    if until:
+        sql += " AND timestamp < date(?, '+1 day')"
+        params.append(until)
+    sql += " AND id < ? ORDER BY id DESC LIMIT ?"
+
+    def page_size(sent):
+        return min(EXPORT_PAGE_SIZE, limit - sent) if limit else EXPORT_PAGE_SIZE
+
+    first_page = _proposals_page(sql, params, 2 ** 63 - 1, page_size(0))
+    if not first_page:
+        return None
+
+    def render(row):
+        return render_proposal_markdown(
+            row["topic"], json.loads(row["keywords"]), row["proposal_text"], None if limit == 1 else row["timestamp"]
+        ).encode("utf-8")
+
+    def chunks():
+        page, sent = first_page, 0
+        while page:
+            for row in page:
+                yield (b"\n\n---\n\n" if sent else b"") + render(row)
+                sent += 1
+            if len(page) < EXPORT_PAGE_SIZE or (limit and sent >= limit):
+                return
+            page = _proposals_page(sql, params, page[-1]["id"], page_size(sent))
+
+    return chunks()
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import time
+from agents.database import get_db_connection, log_agent_action  # type: ignore
+
+# APP_WORKERS is the explicit setting; gunicorn and uvicorn default their worker count to $WEB_CONCURRENCY.
+# `uvicorn --workers N` without either runs each worker as a multiprocessing child of its supervisor,
+# so a worker with a multiprocessing parent assumes it has siblings (this also covers --reload).
+_workers = os.getenv("APP_WORKERS") or os.getenv("WEB_CONCURRENCY")
+WORKER_COUNT = int(_workers) if _workers else None
+MULTI_WORKER = WORKER_COUNT > 1 if WORKER_COUNT is not None else multiprocessing.parent_process() is not None
+
+LEASE_TTL_SECONDS = 30        # a leader that stops renewing is replaced after this long
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Lease:
+    """A named lock row in the leases table, held by one worker until it expires or is released.
+
+    try_acquire() is a single upsert that only succeeds if the row is free,
+    expired or already ours, so SQLite's write lock makes it atomic across
+    processes. Holding it means renewing it before ttl runs out.
+    """
+
+    def __init__(self, name, ttl=LEASE_TTL_SECONDS, holder=WORKER_ID):
+        self.name = name
+        self.ttl = ttl
+        self.holder = holder
+        self.expires_at = 0.0   # local deadline, monotonic
+
+    @property
+    def held(self):
+        return time.monotonic() < self.expires_at
+
+    def try_acquire(self, info=None):
+        """Take or renew the lease; info (JSON-serializable) is stored for other workers to read"""
+        now = time.time()
+        started = time.monotonic()
+        conn = get_db_connection()
+        try:
+            cursor = conn.execute(
+                "INSERT INTO leases (name, holder, acquired_at, expires_at, info) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET holder=excluded.holder, expires_at=excluded.expires_at, "
+                "info=excluded.info, acquired_at=CASE WHEN leases.holder=excluded.holder "
+                "THEN leases.acquired_at ELSE excluded.acquired_at END "
+                "WHERE leases.holder=excluded.holder OR leases.expires_at < ?",
+                (self.name, self.holder, now, now + self.ttl, json.dumps(info) if info is not None else None, now)
+            )
+            acquired = cursor.rowcount == 1
+            conn.commit()
+        finally:
+            conn.close()
+        # Count from before the write so a slow commit can only shorten our idea of the lease
+        self.expires_at = started + self.ttl if acquired else 0.0
+        return acquired
+
+    def release(self):
+        self.expires_at = 0.0
+        conn = get_db_connection()
+        try:
+            conn.execute("DELETE FROM leases WHERE name=? AND holder=?", (self.name, self.holder))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def current(self):
+        """The row as other workers see it, or None if nobody holds the lease"""
+        conn = get_db_connection()
+        try:
+            row = conn.execute(
+                "SELECT holder, acquired_at, expires_at, info FROM leases WHERE name=? AND expires_at >= ?",
+                (self.name, time.time())
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return {
+            "holder": row["holder"],
+            "acquired_at": row["acquired_at"],
+            "expires_in_s": round(row["expires_at"] - time.time(), 1),
+            "info": json.loads(row["info"]) if row["info"] else None,
+        }
+
+
+class LeaderElection:
+    """Keeps trying to take and renew a lease so exactly one worker leads.
+
+    run() renews every ttl/3 seconds. is_leader turns False on its own once
+    the lease would have expired, so a worker whose renewals stall stops
+    acting as leader before another one can take over.
+    """
+
+    def __init__(self, name, ttl=LEASE_TTL_SECONDS, info=None):
+        self.lease = Lease(name, ttl)
+        self.info = info            # optional callable; its result is published with every renewal
+        self.interval = ttl / 3
+        self._was_leader = False
+
+    @property
+    def is_leader(self):
+        return self.lease.held
+
+    def renew(self):
+        info = self.info() if self.info else None
+        try:
+            leader = self.lease.try_acquire(info)
+        except Exception as e:
+            print(f"[Leader] ❌ Could not renew {self.lease.name} lease: {e}")
+            leader = self.lease.held
+        if leader != self._was_leader:
+            self._was_leader = leader
+            print(f"[Leader] {'✅ Acquired' if leader else '⏸️ Lost'} {self.lease.name} lease ({WORKER_ID})")
+            log_agent_action("leader", "acquired" if leader else "lost", {"lease": self.lease.name, "worker": WORKER_ID})
+        return leader
+
+    async def run(self):
+        while True:
+            await asyncio.to_thread(self.renew)
+            await asyncio.sleep(self.interval)
+
+    def stop(self):
+        if self.lease.held:
+            self.lease.release()
+        self._was_leader = False
+
+    def get_status(self):
+        current = self.lease.current()
+        return {
+            "lease": self.lease.name,
+            "worker": WORKER_ID,
+            "workers": WORKER_COUNT,
+            "multi_worker": MULTI_WORKER,
+            "is_leader": self.is_leader,
+            "leader": current["holder"] if current else None,
+            "expires_in_s": current["expires_in_s"] if current else None,
+            "info": current["info"] if current else None,
+        }
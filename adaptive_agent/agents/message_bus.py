@@ -1,14 +1,330 @@
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from agents.database import get_db_connection, log_agent_action  # type: ignore
+from agents.leader import MULTI_WORKER  # type: ignore
+
+BUS_QUEUE_SIZE = 100        # per-subscriber queue bound; the oldest message is dropped when full
+BUS_MAX_RETAINED = 1000     # latest values kept per (topic, correlation_id) for late consumers
+BUS_DURABLE = os.getenv("BUS_DURABLE", "0") == "1"   # write every message to agent_messages and replay on startup
+
+
+class Message:
+    __slots__ = ("id", "topic", "data", "correlation_id", "sender", "published_at", "db_id")
+
+    def __init__(self, id, topic, data, correlation_id=None, sender=None):
+        self.id = id
+        self.topic = topic
+        self.data = data
+        self.correlation_id = correlation_id
+        self.sender = sender
+        self.published_at = time.perf_counter()
+        self.db_id = None
+
+
+class Subscription:
+    """One subscriber's bounded queue for a topic, optionally filtered to a single correlation id"""
+
+    def __init__(self, bus, topic, correlation_id=None, maxsize=BUS_QUEUE_SIZE):
+        self.bus = bus
+        self.topic = topic
+        self.correlation_id = correlation_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def matches(self, message):
+        return self.correlation_id is None or self.correlation_id == message.correlation_id
+
+    def _deliver(self, message):
+        """Runs on the subscriber's loop"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.bus.stats["dropped"] += 1
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        message = await asyncio.wait_for(self.queue.get(), timeout)
+        self.bus._record_consume(message)
+        return message
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+
 class MessageBus:
-    def __init__(self):
-        self.state = {}
+    """In-process pub/sub bus.
+
+    Every subscriber gets its own bounded asyncio queue, so several agents can
+    listen to one topic. Messages carry an optional correlation id so concurrent
+    pipelines only see their own traffic. publish() is safe to call from worker
+    threads. With durable=True each message is also written to agent_messages,
+    where the processed flag tracks delivery, and replay() re-publishes the
+    ones nobody processed before a restart.
+
+    With shared=True, broadcasts (messages without a correlation id) on the
+    topics passed to share() are written to agent_messages and consume()
+    reads the latest one from there, so every worker process sees the same
+    value. Only that latest row is kept per topic. Other topics, and all
+    correlated traffic, stay in-process: a pipeline runs in one worker.
+    """
+
+    def __init__(self, durable=False, shared=False, shared_topics=()):
+        self.durable = durable
+        self.shared = shared
+        self.shared_topics = set(shared_topics)
+        self.state = {}                  # topic -> latest data, for the legacy consume()
+        self._retained = OrderedDict()   # (topic, correlation_id) -> latest Message
+        self._subscribers = defaultdict(list)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.stats = {"published": 0, "consumed": 0, "dropped": 0, "persisted": 0}
+        self._topic_stats = defaultdict(lambda: {"published": 0, "consumed": 0, "latency_ms_total": 0.0, "latency_ms_max": 0.0})
+
+    # --- publishing ---
+
+    def publish(self, topic, data, correlation_id=None, sender=None):
+        message = Message(next(self._ids), topic, data, correlation_id, sender)
+        self._dispatch(message)
+        if self._is_shared(topic, correlation_id):
+            self._run_off_loop(self._persist, message)
+        elif self.durable:
+            self._persist_async(message)
+        log_agent_action("message_bus", "publish", {"topic": topic, "correlation_id": correlation_id})
+        return message.id
+
+    def _dispatch(self, message):
+        """Retain a message and hand it to matching subscribers, in this process only"""
+        topic = message.topic
+        with self._lock:
+            self.state[topic] = message.data
+            key = (topic, message.correlation_id)
+            self._retained[key] = message
+            self._retained.move_to_end(key)
+            while len(self._retained) > BUS_MAX_RETAINED:
+                self._retained.popitem(last=False)
+            subscribers = [s for s in self._subscribers[topic] if s.matches(message)]
+        self.stats["published"] += 1
+        self._topic_stats[topic]["published"] += 1
+
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(subscription._deliver, message)
+
+    def share(self, topic):
+        """Share a topic's broadcasts with the other workers; call it in every worker, e.g. at import"""
+        self.shared_topics.add(topic)
+
+    def _is_shared(self, topic, correlation_id):
+        return self.shared and correlation_id is None and topic in self.shared_topics
+
+    # --- consuming ---
+
+    def consume(self, topic, correlation_id=None):
+        """Latest value published on a topic (non-blocking)"""
+        if self._is_shared(topic, correlation_id):
+            data = self._latest_persisted(topic)
+            log_agent_action("message_bus", "consume", {"topic": topic, "correlation_id": None, "shared": True})
+            return data
+        with self._lock:
+            if correlation_id is None:
+                data = self.state.get(topic)
+            else:
+                message = self._retained.get((topic, correlation_id))
+                data = message.data if message else None
+        log_agent_action("message_bus", "consume", {"topic": topic, "correlation_id": correlation_id})
+        return data
+
+    def subscribe(self, topic, correlation_id=None, maxsize=BUS_QUEUE_SIZE):
+        subscription = Subscription(self, topic, correlation_id, maxsize)
+        with self._lock:
+            self._subscribers[topic].append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscribers[subscription.topic]:
+                self._subscribers[subscription.topic].remove(subscription)
+
+    async def wait_for(self, topic, correlation_id, timeout=None):
+        """Await the data published on topic for this correlation id.
+
+        Returns immediately if it was already published, otherwise waits up to
+        timeout seconds; raises asyncio.TimeoutError on expiry. Several stages
+        may wait on the same message.
+        """
+        subscription = self.subscribe(topic, correlation_id)
+        try:
+            with self._lock:
+                message = self._retained.get((topic, correlation_id))
+            if message is not None:
+                self._record_consume(message)
+                return message.data
+            message = await subscription.get(timeout)
+            return message.data
+        finally:
+            subscription.close()
+
+    def release(self, correlation_id):
+        """Drop retained (and, when durable, persisted) messages for a finished correlation id"""
+        with self._lock:
+            for key in [k for k in self._retained if k[1] == correlation_id]:
+                del self._retained[key]
+        if self.durable:
+            self._run_off_loop(self._forget, correlation_id)
+
+    def _record_consume(self, message):
+        latency_ms = (time.perf_counter() - message.published_at) * 1000
+        topic_stats = self._topic_stats[message.topic]
+        topic_stats["consumed"] += 1
+        topic_stats["latency_ms_total"] += latency_ms
+        topic_stats["latency_ms_max"] = max(topic_stats["latency_ms_max"], latency_ms)
+        self.stats["consumed"] += 1
+        if self.durable:
+            self._persist_async(message, processed=True)
+
+    # --- durable mode ---
+
+    def _persist(self, message, processed=False):
+        conn = get_db_connection()
+        try:
+            if processed:
+                if message.db_id is not None:
+                    conn.execute("UPDATE agent_messages SET processed=1 WHERE id=?", (message.db_id,))
+                else:
+                    # Consumed before its insert landed: mark the oldest pending match
+                    conn.execute(
+                        "UPDATE agent_messages SET processed=1 WHERE id=(SELECT MIN(id) FROM agent_messages "
+                        "WHERE message_type=? AND receiver=? AND processed=0)",
+                        (message.topic, message.correlation_id or "*")
+                    )
+            else:
+                cursor = conn.execute(
+                    "INSERT INTO agent_messages (sender, receiver, message_type, content) VALUES (?, ?, ?, ?)",
+                    (message.sender or "unknown", message.correlation_id or "*", message.topic,
+                     json.dumps(message.data, default=lambda o: dict(o) if hasattr(o, "keys") else str(o)))
+                )
+                message.db_id = cursor.lastrowid
+                if self._is_shared(message.topic, message.correlation_id):
+                    # Workers only ever read the newest broadcast per topic; keep that one row
+                    conn.execute(
+                        "DELETE FROM agent_messages WHERE message_type=? AND receiver='*' AND id < ?",
+                        (message.topic, message.db_id)
+                    )
+                self.stats["persisted"] += 1
+            conn.commit()
+        finally:
+            conn.close()
+
+    def pending(self, topic=None, limit=BUS_MAX_RETAINED):
+        """Durable messages that no subscriber has processed yet (e.g. after a restart), oldest first"""
+        sql = "SELECT id, sender, receiver, message_type, content, timestamp FROM agent_messages WHERE processed=0"
+        params = []
+        if topic is not None:
+            sql += " AND message_type=?"
+            params.append(topic)
+        conn = get_db_connection()
+        try:
+            rows = conn.execute(sql + " ORDER BY id LIMIT ?", (*params, limit)).fetchall()
+        finally:
+            conn.close()
+        return [
+            {"id": r["id"], "topic": r["message_type"], "sender": r["sender"],
+             "correlation_id": None if r["receiver"] == "*" else r["receiver"],
+             "data": json.loads(r["content"]), "timestamp": r["timestamp"]}
+            for r in rows
+        ]
+
+    def ack(self, message_ids):
+        conn = get_db_connection()
+        try:
+            conn.executemany("UPDATE agent_messages SET processed=1 WHERE id=?", [(i,) for i in message_ids])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def replay(self, topic=None, limit=BUS_MAX_RETAINED):
+        """Re-publish unprocessed durable messages in this process; returns how many.
+
+        They reach subscribers and consume() like fresh publishes but are not
+        written again: consuming one sets the processed flag on its original row.
+        """
+        if not self.durable:
+            return 0
+        rows = self.pending(topic, limit)
+        for row in rows:
+            message = Message(next(self._ids), row["topic"], row["data"], row["correlation_id"], row["sender"])
+            message.db_id = row["id"]
+            self._dispatch(message)
+        if rows:
+            print(f"[Bus] ✅ Replayed {len(rows)} unprocessed messages")
+            log_agent_action("message_bus", "replay", {"messages": len(rows)})
+        return len(rows)
+
+    def _persist_async(self, message, processed=False):
+        self._run_off_loop(self._persist, message, processed)
+
+    def _forget(self, correlation_id):
+        conn = get_db_connection()
+        try:
+            conn.execute("DELETE FROM agent_messages WHERE receiver=?", (correlation_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _run_off_loop(func, *args):
+        """Run a DB write in the executor when called from the event loop, inline otherwise.
+
+        Inline writes from threads are visible to other workers as soon as publish() returns.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            func(*args)
+            return
+        loop.run_in_executor(None, func, *args)
+
+    def _latest_persisted(self, topic):
+        conn = get_db_connection()
+        try:
+            row = conn.execute(
+                "SELECT content FROM agent_messages WHERE message_type=? AND receiver='*' ORDER BY id DESC LIMIT 1",
+                (topic,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row["content"]) if row else None
 
-    def publish(self, topic, data):
-        print(f"[BUS] Published: {topic}")
-        self.state[topic] = data
+    # --- metrics ---
 
-    def consume(self, topic):
-        print(f"[BUS] Consumed: {topic}")
-        return self.state.get(topic)
+    def get_stats(self):
+        with self._lock:
+            depths = {
+                topic: sum(s.queue.qsize() for s in subs)
+                for topic, subs in self._subscribers.items() if subs
+            }
+            subscriber_counts = {topic: len(subs) for topic, subs in self._subscribers.items() if subs}
+        topics = {}
+        for topic, s in self._topic_stats.items():
+            topics[topic] = {
+                "published": s["published"],
+                "consumed": s["consumed"],
+                "avg_latency_ms": round(s["latency_ms_total"] / s["consumed"], 3) if s["consumed"] else None,
+                "max_latency_ms": round(s["latency_ms_max"], 3),
+                "queue_depth": depths.get(topic, 0),
+                "subscribers": subscriber_counts.get(topic, 0),
+            }
+        return {**self.stats, "retained": len(self._retained), "topics": topics}
 
 
-bus = MessageBus()
+# With several workers, broadcasts on shared topics go through SQLite
+bus = MessageBus(durable=BUS_DURABLE, shared=MULTI_WORKER)
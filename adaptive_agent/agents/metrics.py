@@ -0,0 +1,345 @@
+import bisect
+import contextvars
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+METRIC_PREFIX = "adaptive_agent"
+# Upper bounds (seconds) shared by every latency histogram; covers SQLite reads up to slow LLM calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))   # 0 disables the slow-request profiler
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", "0.01"))
+SLOW_REQUESTS_KEPT = 20
+MAX_LABEL_VALUES = 50   # nested stats dicts with more keys than this are not exported
+PROFILE_STACK_DEPTH = 25
+
+# Innermost functions of a thread that is waiting rather than working
+IDLE_FUNCTIONS = {"select", "poll", "epoll", "wait", "_worker", "get", "accept", "run_forever", "_run_once"}
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, one series per label tuple"""
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            label_text = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(self.label_names, labels))
+            sep = "," if label_text else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text}{sep}le="{bound}"}} {cumulative}')
+            cumulative += values[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{label_text}{sep}le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {values[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _flatten(prefix, stats):
+    """(name, labels, value) samples for the numeric values in a stats dict.
+
+    Nested dicts such as per-topic bus stats become a "key" label. Dicts with
+    more than MAX_LABEL_VALUES keys are skipped rather than turned into an
+    unbounded number of series.
+    """
+    for key, value in stats.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, bool) or value is None:
+            continue
+        if isinstance(value, (int, float)):
+            yield name, "", value
+        elif isinstance(value, dict) and len(value) <= MAX_LABEL_VALUES:
+            for sub_key, sub_value in value.items():
+                label = f'key="{_escape(sub_key)}"'
+                if isinstance(sub_value, dict):
+                    for field, v in sub_value.items():
+                        if isinstance(v, (int, float)) and not isinstance(v, bool):
+                            yield f"{name}_{field}", label, v
+                elif isinstance(sub_value, (int, float)) and not isinstance(sub_value, bool):
+                    yield name, label, sub_value
+
+
+# === Per-request state ===
+
+class RequestRecord:
+    """Timing state for one in-flight HTTP request, shared by every span it runs"""
+
+    __slots__ = ("method", "path", "started", "spans", "threads", "samples")
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.spans = {}           # span name -> total seconds
+        self.threads = {threading.get_ident()}
+        self.samples = None       # Counter of stacks, only while the profiler is on
+
+
+_current_request = contextvars.ContextVar("current_request", default=None)
+
+
+class Metrics:
+    """Request and span latency histograms plus stats collectors, rendered as Prometheus text.
+
+    Spans are plain perf_counter pairs feeding a histogram; with the profiler
+    off the per-request cost is a couple of lock-protected list increments.
+    """
+
+    def __init__(self):
+        self.requests = Histogram(
+            f"{METRIC_PREFIX}_http_request_duration_seconds",
+            "HTTP request latency by route, until the last body byte is sent",
+            ("method", "route", "status"),
+        )
+        self.spans = Histogram(
+            f"{METRIC_PREFIX}_span_duration_seconds",
+            "Time spent in each agent step (arXiv fetch, analysis, LLM, formatting, DB)",
+            ("span",),
+        )
+        self.in_flight = {}        # id -> RequestRecord
+        self._ids = itertools.count()
+        self._collectors = []      # (prefix, callable returning a stats dict)
+        self.profiler = None
+
+    # --- spans ---
+
+    @contextmanager
+    def span(self, name):
+        record = _current_request.get()
+        if record is not None:
+            record.threads.add(threading.get_ident())
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.spans.observe((name,), elapsed)
+            if record is not None:
+                record.spans[name] = record.spans.get(name, 0.0) + elapsed
+
+    # --- requests ---
+
+    def start_request(self, method, path):
+        record = RequestRecord(method, path)
+        request_id = next(self._ids)
+        self.in_flight[request_id] = record
+        return request_id, record, _current_request.set(record)
+
+    def finish_request(self, request_id, record, token, route, status):
+        _current_request.reset(token)
+        self.in_flight.pop(request_id, None)
+        elapsed = time.perf_counter() - record.started
+        self.requests.observe((record.method, route, str(status)), elapsed)
+        if self.profiler is not None:
+            self.profiler.finished(record, route, status, elapsed)
+
+    # --- collectors ---
+
+    def register_collector(self, prefix, collect):
+        """collect() returns a stats dict; its numeric values are exported as {METRIC_PREFIX}_{prefix}_{key}"""
+        self._collectors.append((prefix, collect))
+
+    def render(self):
+        lines = self.requests.render() + self.spans.render()
+        lines.append(f"# TYPE {METRIC_PREFIX}_http_requests_in_flight gauge")
+        lines.append(f"{METRIC_PREFIX}_http_requests_in_flight {len(self.in_flight)}")
+        for prefix, collect in self._collectors:
+            try:
+                stats = collect()
+            except Exception as e:
+                print(f"[Metrics] ❌ Collector {prefix} failed: {e}")
+                continue
+            typed = set()
+            for name, labels, value in _flatten(f"{METRIC_PREFIX}_{prefix}", stats):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} untyped")
+                lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def server_timing(record):
+    """Server-Timing header value with the spans a request has run so far"""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in record.spans.items())
+
+
+class TimingMiddleware:
+    """ASGI middleware timing every HTTP request by its route template.
+
+    Adds a Server-Timing header so the per-span breakdown shows up in browser
+    dev tools; spans still running when headers go out (streamed bodies) are
+    only counted in the histograms.
+    """
+
+    def __init__(self, app, registry=None):
+        self.app = app
+        self.metrics = registry or metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id, record, token = self.metrics.start_request(scope["method"], scope["path"])
+        status = 500
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if record.spans:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(record).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            route = scope.get("route")
+            route = getattr(route, "path", None) or ("/static" if scope["path"].startswith("/static/") else "unmatched")
+            self.metrics.finish_request(request_id, record, token, route, status)
+
+
+# === Slow-request profiler ===
+
+class SlowRequestProfiler:
+    """Samples the stacks of threads serving in-flight requests and keeps the slowest requests.
+
+    A daemon thread wakes every interval while requests are in flight and
+    reads sys._current_frames() for the threads each request has touched
+    (the event loop thread plus any worker thread that ran one of its spans).
+    Requests that take at least threshold_ms keep their most frequent stacks.
+    """
+
+    def __init__(self, metrics, threshold_ms=SLOW_REQUEST_MS, interval=PROFILE_INTERVAL_SECONDS,
+                 keep=SLOW_REQUESTS_KEPT):
+        self.metrics = metrics
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self.keep = keep
+        self._slowest = []   # min-heap of (seconds, seq, report)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.stats = {"samples": 0, "slow_requests": 0}
+        self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            records = list(self.metrics.in_flight.values())
+            if not records:
+                continue
+            frames = sys._current_frames()
+            stacks = {}
+            with self._lock:
+                self._sample(records, frames, stacks, own)
+            self.stats["samples"] += 1
+
+    def _sample(self, records, frames, stacks, own):
+        for record in records:
+            if record.samples is None:
+                record.samples = Counter()
+            for thread_id in list(record.threads):
+                if thread_id == own:
+                    continue
+                if thread_id not in stacks:
+                    frame = frames.get(thread_id)
+                    stacks[thread_id] = _stack(frame) if frame is not None else None
+                if stacks[thread_id]:
+                    record.samples[stacks[thread_id]] += 1
+
+    def finished(self, record, route, status, elapsed):
+        if elapsed < self.threshold:
+            return
+        self.stats["slow_requests"] += 1
+        with self._lock:
+            samples = Counter(record.samples or {})
+        total = sum(samples.values())
+        report = {
+            "method": record.method,
+            "path": record.path,
+            "route": route,
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 1),
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "spans_ms": {name: round(s * 1000, 1) for name, s in record.spans.items()},
+            "samples": total,
+            "top_stacks": [
+                {"share": round(count / total, 3), "stack": list(stack)}
+                for stack, count in samples.most_common(5)
+            ],
+        }
+        spans = ", ".join(f"{n} {ms} ms" for n, ms in report["spans_ms"].items())
+        print(f"[Metrics] 🐢 Slow request {record.method} {record.path} {report['duration_ms']} ms"
+              + (f" ({spans})" if spans else ""))
+        with self._lock:
+            entry = (elapsed, next(self._seq), report)
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heappushpop(self._slowest, entry)
+
+    def slowest(self):
+        with self._lock:
+            return [report for _, _, report in sorted(self._slowest, reverse=True)]
+
+
+def _stack(frame):
+    """Compact outermost-first stack, or None if the thread is idle"""
+    if frame.f_code.co_name in IDLE_FUNCTIONS:
+        return None
+    entries = []
+    while frame is not None and len(entries) < PROFILE_STACK_DEPTH:
+        code = frame.f_code
+        entries.append(f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}")
+        frame = frame.f_back
+    return tuple(reversed(entries))
+
+
+metrics = Metrics()
+span = metrics.span
+
+
+def enable_profiler(threshold_ms=SLOW_REQUEST_MS):
+    """Start sampling stacks of in-flight requests; requests over threshold_ms are kept"""
+    if metrics.profiler is None and threshold_ms > 0:
+        metrics.profiler = SlowRequestProfiler(metrics, threshold_ms=threshold_ms).start()
+    return metrics.profiler
@@ -0,0 +1,126 @@
+import sys
+from array import array
+from datetime import datetime, timezone
+
+PUBLISHED_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def parse_published(value):
+    """Parse arXiv's published timestamp into an aware UTC datetime"""
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.strptime(value, PUBLISHED_FORMAT).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return datetime.fromisoformat(value)
+
+
+def format_published(value):
+    return value.astimezone(timezone.utc).strftime(PUBLISHED_FORMAT)
+
+
+class Paper:
+    """Compact arXiv paper record.
+
+    Supports dict-style access (paper["title"], dict(paper)) so code written
+    against the old 4-key dicts keeps working during the migration.
+    """
+    __slots__ = ("title", "summary", "published", "link")
+
+    FIELDS = ("title", "summary", "published", "link")
+
+    def __init__(self, title, summary, published, link):
+        # Titles and links repeat across topics and refreshes. Summaries are ~1 KB and
+        # almost always unique, so interning them would only pin every abstract ever seen.
+        self.title = sys.intern(title)
+        self.summary = summary
+        self.published = parse_published(published)
+        self.link = sys.intern(link)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["title"], data["summary"], data["published"], data["link"])
+
+    def to_dict(self):
+        return {
+            "title": self.title,
+            "summary": self.summary,
+            "published": format_published(self.published),
+            "link": self.link
+        }
+
+    def keys(self):
+        return self.FIELDS
+
+    def __getitem__(self, key):
+        if key == "published":
+            return format_published(self.published)
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        if isinstance(other, Paper):
+            return self.link == other.link and self.published == other.published
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.link, self.published))
+
+    def __repr__(self):
+        return f"Paper(title={self.title!r}, link={self.link!r})"
+
+
+def as_paper(obj):
+    """Accept either a Paper or a legacy paper dict"""
+    return obj if isinstance(obj, Paper) else Paper.from_dict(obj)
+
+
+class PaperBatch:
+    """Columnar container for bulk analysis: one list per field, timestamps as a float array"""
+
+    def __init__(self):
+        self.titles = []
+        self.summaries = []
+        self.published = array("d")
+        self.links = []
+
+    @classmethod
+    def from_papers(cls, papers):
+        """A batch from Paper records or paper dicts; an existing batch is returned as is"""
+        if isinstance(papers, cls):
+            return papers
+        batch = cls()
+        for paper in papers:
+            batch.append(paper)
+        return batch
+
+    def append(self, paper):
+        paper = as_paper(paper)
+        self.titles.append(paper.title)
+        self.summaries.append(paper.summary)
+        self.published.append(paper.published.timestamp())
+        self.links.append(paper.link)
+
+    def texts(self):
+        """Title and summary of each paper, joined for tokenization"""
+        return (f"{t} {s}" for t, s in zip(self.titles, self.summaries))
+
+    def __len__(self):
+        return len(self.links)
+
+    def __getitem__(self, i):
+        return Paper(
+            self.titles[i], self.summaries[i],
+            datetime.fromtimestamp(self.published[i], tz=timezone.utc), self.links[i]
+        )
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
@@ -0,0 +1,161 @@
+import asyncio
+import time
+import uuid
+from agents.message_bus import bus  # type: ignore
+from agents.research_agent import afetch_arxiv_papers  # type: ignore
+from agents.analysis_agent import analyze_from_bus  # type: ignore
+from agents.innovation_agent import agenerate_from_bus, format_innovation_proposal  # type: ignore
+from agents.database import save_proposal, db_execute, log_agent_action  # type: ignore
+
+# Seconds each stage may spend on its own work (time spent waiting for upstream input is not counted)
+STAGE_TIMEOUTS = {
+    "fetch": 30,
+    "analyze": 10,
+    "generate": 90,
+    "format": 5,
+    "save_proposal": 10,
+}
+
+
+class StageError(Exception):
+    """A pipeline stage failed or ran past its timeout"""
+
+    def __init__(self, stage, message, timed_out=False):
+        super().__init__(f"{stage}: {message}")
+        self.stage = stage
+        self.timed_out = timed_out
+
+
+class PipelineRun:
+    """State for one run: correlation id, per-stage timings and results"""
+
+    def __init__(self, topics, max_results=5, user=None, timeouts=None):
+        self.correlation_id = uuid.uuid4().hex
+        self.topics = topics
+        self.max_results = max_results
+        self.user = user
+        self.timeouts = {**STAGE_TIMEOUTS, **(timeouts or {})}
+        self.timings = {}
+        self.papers = 0
+        self.keywords = []
+        self.proposal = None
+        self.formatted = None
+        self.proposal_id = None
+        self.started = time.perf_counter()
+
+    async def timed(self, stage, awaitable):
+        """Await one stage's work under its timeout and record how long it took"""
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(awaitable, self.timeouts[stage])
+        except asyncio.TimeoutError:
+            raise StageError(stage, f"timed out after {self.timeouts[stage]}s", timed_out=True)
+        except StageError:
+            raise
+        except Exception as e:
+            raise StageError(stage, str(e)) from e
+        finally:
+            self.timings[stage] = round((time.perf_counter() - start) * 1000, 1)
+
+    def result(self):
+        timings = {stage: self.timings[stage] for stage in STAGE_TIMEOUTS if stage in self.timings}
+        return {
+            "correlation_id": self.correlation_id,
+            "topics": self.topics,
+            "papers": self.papers,
+            "keywords": self.keywords,
+            "proposal": self.proposal,
+            "formatted": self.formatted,
+            "proposal_id": self.proposal_id,
+            "timings_ms": {**timings, "total": round((time.perf_counter() - self.started) * 1000, 1)},
+        }
+
+
+# === Stages ===
+
+async def _research_stage(run):
+    """Fetch every topic concurrently, then publish the merged papers for this run"""
+    cid = run.correlation_id
+    if len(run.topics) == 1:
+        papers = await run.timed("fetch", afetch_arxiv_papers(run.topics[0], run.max_results, correlation_id=cid))
+        run.papers = len(papers)
+        return
+
+    batches = await run.timed("fetch", asyncio.gather(*(
+        afetch_arxiv_papers(topic, run.max_results, correlation_id=f"{cid}:{topic}") for topic in run.topics
+    )))
+    papers, seen = [], set()
+    for paper in (p for batch in batches for p in batch):
+        if paper["link"] not in seen:
+            seen.add(paper["link"])
+            papers.append(paper)
+    for topic in run.topics:
+        bus.release(f"{cid}:{topic}")
+    run.papers = len(papers)
+    bus.publish("papers", papers, correlation_id=cid, sender="research_agent")
+
+
+async def _analysis_stage(run):
+    await bus.wait_for("papers", run.correlation_id)
+    run.keywords = await run.timed("analyze", asyncio.to_thread(analyze_from_bus, run.correlation_id))
+
+
+async def _innovation_stage(run):
+    await bus.wait_for("keywords", run.correlation_id)
+    run.proposal = await run.timed("generate", agenerate_from_bus(run.correlation_id, run.user))
+    run.formatted = await run.timed("format", asyncio.to_thread(format_innovation_proposal, run.proposal))
+
+
+async def _persist_stage(run):
+    """Store the proposal with its keywords once the LLM has produced one.
+
+    The row is only inserted with its final text: a blank placeholder would be
+    picked up by the cache warm-up, exports and search if the call never finished.
+    """
+    keywords = await bus.wait_for("keywords", run.correlation_id)
+    proposal = await bus.wait_for("proposal", run.correlation_id)
+    run.proposal_id = await run.timed("save_proposal", asyncio.to_thread(
+        save_proposal, run.user, ", ".join(run.topics), [kw for kw, _ in keywords], proposal
+    ))
+
+
+async def run_pipeline(topics, max_results=5, user=None, timeouts=None):
+    """Run research -> analysis -> innovation for one request.
+
+    Stages run as concurrent tasks that hand data to each other over the bus
+    under a per-run correlation id. When user is given the proposal is saved
+    alongside formatting. Raises StageError if any stage fails or times out;
+    the other stages are cancelled and nothing is saved.
+    """
+    if isinstance(topics, str):
+        topics = [topics]
+    topics = [t.strip() for t in topics if t.strip()]
+    if not topics:
+        raise ValueError("at least one topic is required")
+
+    run = PipelineRun(topics, max_results, user, timeouts)
+    stages = [_research_stage(run), _analysis_stage(run), _innovation_stage(run)]
+    if user:
+        stages.append(_persist_stage(run))
+    tasks = [asyncio.create_task(stage) for stage in stages]
+
+    try:
+        await asyncio.gather(*tasks)
+    except Exception as e:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if run.proposal_id is not None:
+            await db_execute("DELETE FROM proposals WHERE id=?", (run.proposal_id,))
+            run.proposal_id = None
+        log_agent_action("pipeline", "failed", {"topics": topics, "error": str(e), "timings_ms": run.timings})
+        raise
+    finally:
+        bus.release(run.correlation_id)
+
+    result = run.result()
+    log_agent_action("pipeline", "run", {
+        "correlation_id": run.correlation_id, "topics": topics, "user": user,
+        "proposal_id": run.proposal_id, "timings_ms": result["timings_ms"],
+    })
+    return result
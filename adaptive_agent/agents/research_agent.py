@@ -1,32 +1,391 @@
-import requests # type: ignore 
-import xml.etree.ElementTree as ET 
-from agents.message_bus import MessageBus  # type: ignore 
-
-bus = MessageBus()
-def fetch_arxiv_papers(topic="artificial intelligence", max_results=5):
-    url = f"http://export.arxiv.org/api/query?search_query=all:{topic}&start=0&max_results={max_results}"
-    response = requests.get(url)
-    root = ET.fromstring(response.content)
-    ns = {"atom": "http://www.w3.org/2005/Atom"}
-
-    papers = []
-    for entry in root.findall("atom:entry", ns):
-        title = entry.find("atom:title", ns).text.strip()
-        summary = entry.find("atom:summary", ns).text.strip()
-        published = entry.find("atom:published", ns).text
-        link = entry.find("atom:link", ns).attrib["href"]
-
-        papers.append({
-            "title": title,
-            "summary": summary,
-            "published": published,
-            "link": link
-        })
-    bus.publish("papers", papers)  
+import asyncio
+import io
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import requests # type: ignore
+from requests.adapters import HTTPAdapter # type: ignore
+from urllib3.util.retry import Retry # type: ignore
+import xml.etree.ElementTree as ET
+from agents.message_bus import bus  # type: ignore
+from agents.database import get_db_connection, log_agent_action  # type: ignore
+from agents.paper import Paper  # type: ignore
+from agents.analysis_agent import index_papers  # type: ignore
+from agents.similarity import similarity_index  # type: ignore
+from agents.metrics import span  # type: ignore
+from agents.leader import Lease  # type: ignore
 
+# === Paper Cache ===
+
+CACHE_TTL_SECONDS = 600          # entries older than this are served stale and refreshed
+CACHE_MAX_STALE_SECONDS = 86400  # entries older than this are treated as a miss
+CACHE_MAX_ENTRIES = 128          # in-memory LRU size
+REFRESH_LEASE_SECONDS = 60       # how long one worker may hold the arXiv refresh for a key
+REFRESH_WAIT_SECONDS = 30        # how long a cold lookup waits for another worker's fetch
+REFRESH_POLL_SECONDS = 0.25
+
+_memory_cache = OrderedDict()    # (topic, max_results) -> (fetched_at, papers)
+_cache_lock = threading.Lock()
+_refreshing = set()
+cache_stats = {"hits": 0, "stale_hits": 0, "db_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0,
+               "shared_refreshes": 0}
+
+
+def _cache_key(topic, max_results):
+    return (topic.strip().lower(), int(max_results))
+
+
+def _remember(key, fetched_at, papers):
+    with _cache_lock:
+        _memory_cache[key] = (fetched_at, papers)
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > CACHE_MAX_ENTRIES:
+            _memory_cache.popitem(last=False)
+
+
+def _stored_fetch(conn, topic):
+    """The topic's paper_cache_fetches marker: how many results were requested and when, or None"""
+    return conn.execute("SELECT requested, fetched_at FROM paper_cache_fetches WHERE topic=?", (topic,)).fetchone()
+
+
+@span("paper_cache_read")
+def _load_from_db(key):
+    """Return (fetched_at, papers) from paper_cache, or None if the topic was never fetched with at least max_results.
+
+    A topic with fewer papers than were requested is still a hit: the marker,
+    not the row count, says what the stored set covers.
+    """
+    topic, max_results = key
+    conn = get_db_connection()
+    try:
+        marker = _stored_fetch(conn, topic)
+        if marker is None or marker["requested"] < max_results:
+            return None
+        rows = conn.execute(
+            "SELECT title, summary, published, link FROM paper_cache WHERE topic=? ORDER BY id LIMIT ?",
+            (topic, max_results)
+        ).fetchall()
+    finally:
+        conn.close()
+    papers = [Paper(r["title"], r["summary"], r["published"], r["link"]) for r in rows]
+    return marker["fetched_at"], papers
+
+
+@span("paper_cache_write")
+def _store_in_db(topic, requested, papers, fetched_at):
+    """Replace the topic's cached papers, unless a larger set that is still usable is stored; returns whether it wrote"""
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        marker = _stored_fetch(conn, topic)
+        if (marker is not None and marker["requested"] > requested
+                and fetched_at - marker["fetched_at"] < CACHE_MAX_STALE_SECONDS):
+            conn.rollback()
+            return False
+        conn.execute("DELETE FROM paper_cache WHERE topic=?", (topic,))
+        conn.executemany(
+            "INSERT INTO paper_cache (topic, title, summary, published, link) VALUES (?, ?, ?, ?, ?)",
+            [(topic, p["title"], p["summary"], p["published"], p["link"]) for p in papers]
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO paper_cache_fetches (topic, requested, fetched_at) VALUES (?, ?, ?)",
+            (topic, requested, fetched_at)
+        )
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+
+def _refresh_size(key):
+    """How many results to fetch for key: the size already stored for the topic if that is larger and costs
+    no extra arXiv request, so a refresh for a small key keeps the larger set current instead of shrinking it"""
+    topic, max_results = key
+    conn = get_db_connection()
+    try:
+        marker = _stored_fetch(conn, topic)
+    finally:
+        conn.close()
+    if marker is not None and max_results < marker["requested"] <= ARXIV_PAGE_SIZE:
+        return marker["requested"]
+    return max_results
+
+
+def _refresh(key):
+    """Fetch from arXiv and write through to both cache tiers"""
+    topic, max_results = key
+    requested = _refresh_size(key)
+    with span("arxiv_fetch"):
+        papers = arxiv_client.fetch(topic, requested)
+    fetched_at = time.time()
+    _store_in_db(topic, requested, papers, fetched_at)
+    cache_stats["refreshes"] += 1
+    try:
+        with span("index_papers"):
+            index_papers(topic, papers)
+            similarity_index.add_papers(papers)
+    except Exception as e:
+        print(f"[Index] ❌ Failed to index papers for {key[0]}: {e}")
+    if requested > max_results:
+        _remember((topic, requested), fetched_at, papers)
+        papers = papers[:max_results]
+    _remember(key, fetched_at, papers)
     return papers
 
 
+def _refresh_lease(key):
+    """Cross-worker lock so only one process refreshes a key from arXiv at a time"""
+    return Lease(f"arxiv:{key[0]}:{key[1]}", ttl=REFRESH_LEASE_SECONDS)
+
+
+def _refresh_shared(key):
+    """_refresh for a cold key, unless another worker is already fetching it: then read its result"""
+    lease = _refresh_lease(key)
+    if lease.try_acquire():
+        try:
+            return _refresh(key)
+        finally:
+            lease.release()
+
+    deadline = time.monotonic() + REFRESH_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(REFRESH_POLL_SECONDS)
+        entry = _load_from_db(key)
+        if entry is not None and time.time() - entry[0] < CACHE_MAX_STALE_SECONDS:
+            cache_stats["shared_refreshes"] += 1
+            _remember(key, *entry)
+            return entry[1]
+        if lease.try_acquire():
+            # The other worker gave up; fetch it ourselves
+            try:
+                return _refresh(key)
+            finally:
+                lease.release()
+    return _refresh(key)
+
+
+def _refresh_in_background(key):
+    with _cache_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def worker():
+        lease = _refresh_lease(key)
+        try:
+            # Another worker refreshing the same key will write paper_cache for us
+            if lease.try_acquire():
+                _refresh(key)
+        except Exception as e:
+            cache_stats["refresh_errors"] += 1
+            print(f"[Cache] ❌ Background refresh failed for {key}: {e}")
+        finally:
+            if lease.held:
+                lease.release()
+            with _cache_lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=worker, daemon=True).start()
+
+
+def get_cached_papers(topic, max_results):
+    """Read-through lookup: memory LRU, then paper_cache, then arXiv"""
+    key = _cache_key(topic, max_results)
+    now = time.time()
+
+    with _cache_lock:
+        entry = _memory_cache.get(key)
+        if entry:
+            _memory_cache.move_to_end(key)
+
+    from_db = False
+    if entry is None:
+        entry = _load_from_db(key)
+        from_db = True
+    elif now - entry[0] >= CACHE_TTL_SECONDS:
+        # Another worker may have refreshed this key since it was cached here
+        shared = _load_from_db(key)
+        if shared is not None and shared[0] > entry[0]:
+            entry, from_db = shared, True
+
+    if entry is None or now - entry[0] >= CACHE_MAX_STALE_SECONDS:
+        cache_stats["misses"] += 1
+        return _refresh_shared(key)
+
+    if from_db:
+        _remember(key, *entry)
+
+    if now - entry[0] >= CACHE_TTL_SECONDS:
+        cache_stats["stale_hits"] += 1
+        _refresh_in_background(key)
+    elif from_db:
+        cache_stats["db_hits"] += 1
+    else:
+        cache_stats["hits"] += 1
+    return entry[1]
+
+
+def get_cache_stats():
+    lookups = cache_stats["hits"] + cache_stats["stale_hits"] + cache_stats["db_hits"] + cache_stats["misses"]
+    served = lookups - cache_stats["misses"]
+    return {
+        **cache_stats,
+        "entries": len(_memory_cache),
+        "hit_rate": round(served / lookups, 3) if lookups else 0.0,
+    }
+
+
+# === arXiv Client ===
+
+ARXIV_API_URL = "https://export.arxiv.org/api/query"
+ATOM_NS = {"atom": "http://www.w3.org/2005/Atom"}
+
+
+ARXIV_PAGE_SIZE = 100             # results per request when streaming large sweeps
+ARXIV_PAGE_DELAY_SECONDS = 3      # arXiv asks clients to pause between consecutive calls
+
+
+def iter_arxiv_entries(source):
+    """Incrementally parse an Atom feed from a file-like object, yielding one paper per entry"""
+    entry_tag = "{%s}entry" % ATOM_NS["atom"]
+    root = None
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            continue
+        if elem.tag != entry_tag:
+            continue
+
+        yield Paper(
+            elem.find("atom:title", ATOM_NS).text.strip(),
+            elem.find("atom:summary", ATOM_NS).text.strip(),
+            elem.find("atom:published", ATOM_NS).text,
+            elem.find("atom:link", ATOM_NS).attrib["href"]
+        )
+        # Drop parsed entries so memory stays flat regardless of feed size
+        elem.clear()
+        root.clear()
+
+
+def parse_arxiv_feed(content):
+    return list(iter_arxiv_entries(io.BytesIO(content)))
+
+
+class ArxivClient:
+    """Pooled arXiv API client; concurrent requests for the same query share one upstream call"""
+
+    def __init__(self, base_url=ARXIV_API_URL, connect_timeout=3.05, read_timeout=20,
+                 retries=3, backoff_factor=0.5, pool_size=10):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",),
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._inflight = {}  # (topic, start, max_results) -> Future
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "coalesced": 0, "errors": 0}
+
+    def get_feed(self, topic, max_results, start=0):
+        """Raw Atom response for one page of results"""
+        response = self.session.get(
+            self.base_url,
+            params={"search_query": f"all:{topic}", "start": start, "max_results": max_results},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.content
+
+    def iter_feed(self, topic, max_results, start=0):
+        """Stream one page of results, parsing entries as the body arrives"""
+        with self.session.get(
+            self.base_url,
+            params={"search_query": f"all:{topic}", "start": start, "max_results": max_results},
+            timeout=self.timeout,
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            self.stats["requests"] += 1
+            yield from iter_arxiv_entries(response.raw)
+
+    def fetch(self, topic, max_results, start=0):
+        key = (topic, start, max_results)
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            self.stats["requests"] += 1
+            papers = parse_arxiv_feed(self.get_feed(topic, max_results, start))
+            future.set_result(papers)
+            return papers
+        except Exception as e:
+            self.stats["errors"] += 1
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def close(self):
+        """Close pooled upstream connections; called from the app's shutdown hook"""
+        self.session.close()
+
+
+arxiv_client = ArxivClient()
+
+
+# === arXiv Fetching ===
+
+def fetch_arxiv_papers(topic="artificial intelligence", max_results=5, use_cache=True, correlation_id=None):
+    if use_cache:
+        papers = get_cached_papers(topic, max_results)
+    else:
+        papers = _refresh(_cache_key(topic, max_results))
+    log_agent_action("research_agent", "fetch", {"topic": topic, "max_results": max_results, "count": len(papers)})
+    bus.publish("papers", papers, correlation_id=correlation_id, sender="research_agent")
+
+    return papers
+
 
+def stream_arxiv_papers(topic="artificial intelligence", max_results=1000, page_size=ARXIV_PAGE_SIZE):
+    """Generator over up to max_results papers, paging through arXiv's start offset"""
+    start = 0
+    while start < max_results:
+        if start:
+            time.sleep(ARXIV_PAGE_DELAY_SECONDS)
+        limit = min(page_size, max_results - start)
+        page = []
+        for paper in arxiv_client.iter_feed(topic, limit, start):
+            page.append(paper)
+            yield paper
+            if len(page) == limit:
+                break
+        index_papers(topic, page)
+        similarity_index.add_papers(page)
+        count = len(page)
+        if count < limit:
+            return
+        start += count
 
 
+async def afetch_arxiv_papers(topic="artificial intelligence", max_results=5, use_cache=True, correlation_id=None):
+    """Async variant of fetch_arxiv_papers for use inside async handlers"""
+    return await asyncio.to_thread(fetch_arxiv_papers, topic, max_results, use_cache, correlation_id)
@@ -0,0 +1,101 @@
+import re
+from agents.database import get_db_connection  # type: ignore
+from agents.metrics import span  # type: ignore
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+SNIPPET_TOKENS = 16
+TITLE_WEIGHT = 5.0  # bm25 weight of title matches relative to summary matches
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix.
+
+    Words are quoted so user input can never be parsed as FTS5 syntax.
+    """
+    words = WORD_RE.findall(text.lower())
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+@span("search")
+def search_papers(query, limit=10, topic=None):
+    """Cached papers matching query, best BM25 score first, one entry per arXiv link"""
+    match = fts_query(query)
+    if match is None:
+        return []
+
+    sql = (
+        "SELECT p.title, p.link, p.published, p.topic, "
+        f"snippet(paper_fts, 1, ?, ?, '…', {SNIPPET_TOKENS}) AS snippet, "
+        f"bm25(paper_fts, {TITLE_WEIGHT}, 1.0) AS score "
+        "FROM paper_fts JOIN paper_cache p ON p.id = paper_fts.rowid "
+        "WHERE paper_fts MATCH ?"
+    )
+    params = [HIGHLIGHT_START, HIGHLIGHT_END, match]
+    if topic:
+        sql += " AND p.topic = ?"
+        params.append(topic.strip().lower())
+    # The same paper can be cached under several topics, so over-fetch before de-duplicating
+    sql += " ORDER BY score LIMIT ?"
+    params.append(limit * 4)
+
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+    results, seen = [], set()
+    for row in rows:
+        if row["link"] in seen:
+            continue
+        seen.add(row["link"])
+        results.append({
+            "title": row["title"],
+            "link": row["link"],
+            "published": row["published"],
+            "topic": row["topic"],
+            "snippet": row["snippet"],
+            "score": round(-row["score"], 6),
+        })
+        if len(results) == limit:
+            break
+    return results
+
+
+@span("search")
+def search_proposals(user_id, query, limit=10):
+    """The user's proposals matching query, best BM25 score first"""
+    match = fts_query(query)
+    if match is None:
+        return []
+
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            "SELECT p.id, p.topic, p.timestamp, "
+            f"snippet(proposal_fts, 1, ?, ?, '…', {SNIPPET_TOKENS}) AS snippet, "
+            "bm25(proposal_fts) AS score "
+            "FROM proposal_fts JOIN proposals p ON p.id = proposal_fts.rowid "
+            "WHERE proposal_fts MATCH ? AND p.user_id = ? ORDER BY score LIMIT ?",
+            (HIGHLIGHT_START, HIGHLIGHT_END, match, user_id, limit)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    return [
+        {
+            "id": row["id"],
+            "topic": row["topic"],
+            "timestamp": row["timestamp"],
+            "snippet": row["snippet"],
+            "score": round(-row["score"], 6),
+        }
+        for row in rows
+    ]
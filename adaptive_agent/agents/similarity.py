@@ -0,0 +1,267 @@
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+import numpy as np  # type: ignore
+from agents.database import get_db_connection, log_agent_action  # type: ignore
+from agents.analysis_agent import tokenize  # type: ignore
+from agents.metrics import span  # type: ignore
+
+VECTOR_DIM = 256              # dense dimensions per paper; 100k papers take ~100 MB as float32
+HASH_SPACE = 1 << 20          # term buckets used for document frequencies
+HASHES_PER_TERM = 4           # signed dimensions each term is spread over (sparse random projection)
+NEAR_DUPLICATE_THRESHOLD = 0.95
+INITIAL_CAPACITY = 1024
+
+VERSION_RE = re.compile(r"v\d+$")
+
+# Odd multipliers that spread a term bucket over HASHES_PER_TERM dimensions and signs
+_MIX = np.array([0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F], dtype=np.uint64)[:HASHES_PER_TERM]
+
+
+def canonical_link(link):
+    """arXiv abstract link without its version suffix, so v1 and v2 of a paper compare equal"""
+    return VERSION_RE.sub("", link.strip())
+
+
+class SimilarityIndex:
+    """In-memory hashed TF-IDF vectors for related-paper lookups.
+
+    Each paper's title and summary become a sublinear TF-IDF vector over
+    hashed terms, projected to VECTOR_DIM dimensions by a sparse random
+    projection and L2-normalized, so cosine similarity is a dot product.
+    Vectors live in one growable float32 matrix; queries are a single
+    matrix multiply against it. No model or GPU is involved.
+    """
+
+    def __init__(self, dim=VECTOR_DIM):
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._reset()
+        self.stats = {"added": 0, "version_duplicates": 0, "near_duplicates": 0, "queries": 0, "query_ms_total": 0.0}
+
+    def _reset(self):
+        self.vectors = np.zeros((INITIAL_CAPACITY, self.dim), dtype=np.float32)
+        self.size = 0
+        self.links = []
+        self.titles = []
+        self.rows = {}                # canonical link -> row
+        self.duplicate_of = {}        # canonical link of a skipped near-duplicate -> canonical link kept
+        self.df = np.zeros(HASH_SPACE, dtype=np.int32)
+
+    # --- vectorizing ---
+
+    def _term_buckets(self, paper):
+        counts = Counter(zlib.crc32(t.encode("utf-8")) % HASH_SPACE
+                         for t in tokenize(paper["title"] + " " + paper["summary"]))
+        ids = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        return ids, tf
+
+    def _vectorize(self, buckets, n_docs):
+        """Rows of L2-normalized vectors for a list of (bucket ids, term frequencies)"""
+        vectors = np.zeros((len(buckets), self.dim), dtype=np.float32)
+        idf = np.log((1 + n_docs) / (1 + self.df.astype(np.float32))) + 1
+        for row, (ids, tf) in enumerate(buckets):
+            if not len(ids):
+                continue
+            weights = (1 + np.log(tf)) * idf[ids]
+            mixed = ids.astype(np.uint64)[:, None] * _MIX[None, :]
+            dims = ((mixed >> np.uint64(33)) % np.uint64(self.dim)).astype(np.int64)
+            signs = np.where((mixed >> np.uint64(17)) & np.uint64(1), 1.0, -1.0).astype(np.float32)
+            vectors[row] = np.bincount(dims.ravel(), weights=(weights[:, None] * signs).ravel(), minlength=self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+    # --- ingest ---
+
+    def _append(self, vectors):
+        needed = self.size + len(vectors)
+        if needed > len(self.vectors):
+            capacity = max(needed, 2 * len(self.vectors))
+            grown = np.zeros((capacity, self.dim), dtype=np.float32)
+            grown[:self.size] = self.vectors[:self.size]
+            self.vectors = grown
+        self.vectors[self.size:needed] = vectors
+        self.size = needed
+
+    def _best_matches(self, vectors, chunk_rows=16384):
+        """Highest cosine similarity to any indexed paper, and its row, scanning the matrix in chunks"""
+        best_score = np.full(len(vectors), -np.inf, dtype=np.float32)
+        best_row = np.zeros(len(vectors), dtype=np.int64)
+        for start in range(0, self.size, chunk_rows):
+            scores = vectors @ self.vectors[start:min(start + chunk_rows, self.size)].T
+            rows = np.argmax(scores, axis=1)
+            chunk_best = scores[np.arange(len(vectors)), rows]
+            better = chunk_best > best_score
+            best_score[better] = chunk_best[better]
+            best_row[better] = rows[better] + start
+        return best_score, best_row
+
+    def add_papers(self, papers, detect_near_duplicates=True):
+        """Index papers not seen before; returns how many were added.
+
+        Another version of an indexed paper (same arXiv id) is skipped, and a
+        near-identical text (cosine >= NEAR_DUPLICATE_THRESHOLD to an indexed
+        paper or an earlier one in the batch) is recorded as a duplicate of it
+        instead of getting its own row, so related-paper results are not
+        crowded by copies, and saved to paper_duplicates so a rebuild skips
+        it too. Without detect_near_duplicates only arXiv versions and saved
+        duplicates are collapsed, which keeps bulk loads linear.
+        """
+        with self._lock:
+            added, duplicates = self._add(papers, detect_near_duplicates)
+        if duplicates:
+            self._save_duplicates(duplicates)
+        return added
+
+    def _add(self, papers, detect_near_duplicates):
+        """add_papers with the lock held; returns (rows added, [(canonical link, canonical link kept)])"""
+        new_rows, buckets, seen, duplicates = [], [], set(), []
+        for paper in papers:
+            link = paper["link"].strip()
+            canonical = canonical_link(link)
+            if canonical in self.rows and self.links[self.rows[canonical]] != link:
+                self.stats["version_duplicates"] += 1
+            if canonical in seen or canonical in self.rows or canonical in self.duplicate_of:
+                continue
+            seen.add(canonical)
+            new_rows.append((canonical, paper))
+            buckets.append(self._term_buckets(paper))
+        if not new_rows:
+            return 0, duplicates
+
+        for ids, _ in buckets:
+            self.df[ids] += 1
+        vectors = self._vectorize(buckets, self.size + len(new_rows))
+
+        if not detect_near_duplicates:
+            accepted = list(range(len(new_rows)))
+            new_rows_to_check = []
+        else:
+            # Near-duplicates against the index and against earlier papers in this batch
+            best_score, best_row = self._best_matches(vectors)
+            within = vectors @ vectors.T
+            accepted = []
+            new_rows_to_check = new_rows
+        for i, (canonical, paper) in enumerate(new_rows_to_check):
+            match = None
+            if best_score[i] >= NEAR_DUPLICATE_THRESHOLD:
+                match = canonical_link(self.links[best_row[i]])
+            if match is None:
+                for k in accepted:
+                    if within[i, k] >= NEAR_DUPLICATE_THRESHOLD:
+                        match = new_rows[k][0]
+                        break
+            if match is not None:
+                self.duplicate_of[canonical] = match
+                duplicates.append((canonical, match))
+                self.stats["near_duplicates"] += 1
+                continue
+            accepted.append(i)
+
+        if len(accepted) < len(new_rows):
+            # Skipped copies must not count toward document frequency; re-weight the rest without them
+            for i in set(range(len(new_rows))).difference(accepted):
+                self.df[buckets[i][0]] -= 1
+            vectors = self._vectorize([buckets[i] for i in accepted], self.size + len(accepted))
+        if accepted:
+            first_row = self.size
+            self._append(vectors)
+            for offset, i in enumerate(accepted):
+                canonical, paper = new_rows[i]
+                self.rows[canonical] = first_row + offset
+                self.links.append(paper["link"].strip())
+                self.titles.append(paper["title"])
+            self.stats["added"] += len(accepted)
+        return len(accepted), duplicates
+
+    def _save_duplicates(self, duplicates):
+        conn = get_db_connection()
+        try:
+            conn.executemany("INSERT OR REPLACE INTO paper_duplicates (link, duplicate_of) VALUES (?, ?)", duplicates)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def rebuild_from_cache(self, batch_size=1000):
+        """Rebuild the index from every paper in paper_cache.
+
+        paper_cache keeps near-duplicate copies, so the ones found at ingest
+        are loaded from paper_duplicates first and skipped; checking every
+        pair again would make the rebuild quadratic.
+        """
+        started = time.perf_counter()
+        conn = get_db_connection()
+        try:
+            duplicates = conn.execute("SELECT link, duplicate_of FROM paper_duplicates").fetchall()
+            with self._lock:
+                self._reset()
+                self.duplicate_of.update((row["link"], row["duplicate_of"]) for row in duplicates)
+            cursor = conn.execute("SELECT title, summary, link FROM paper_cache ORDER BY id")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                self.add_papers([dict(r) for r in rows], detect_near_duplicates=False)
+        finally:
+            conn.close()
+        log_agent_action("similarity", "rebuild", {
+            "papers": self.size, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        })
+        return self.size
+
+    # --- queries ---
+
+    def _row_for(self, link):
+        canonical = canonical_link(link)
+        canonical = self.duplicate_of.get(canonical, canonical)
+        return self.rows.get(canonical)
+
+    @span("similarity")
+    def related(self, links, k=10):
+        """Top-k most similar indexed papers for each link, in one matrix multiply.
+
+        Returns {link: [{"link", "title", "score"}, ...]}; links that are not
+        indexed map to None.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            rows = {link: self._row_for(link) for link in links}
+            known = [row for row in rows.values() if row is not None]
+            results = {link: None for link in links}
+            if known:
+                scores = self.vectors[known] @ self.vectors[:self.size].T
+                scores[np.arange(len(known)), known] = -np.inf
+                top_k = min(k, self.size - 1)
+                ranked = {}
+                if top_k > 0:
+                    top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+                    for q, row in enumerate(known):
+                        order = top[q][np.argsort(-scores[q, top[q]], kind="stable")]
+                        ranked[row] = [
+                            {"link": self.links[j], "title": self.titles[j], "score": round(float(scores[q, j]), 4)}
+                            for j in order
+                        ]
+                for link, row in rows.items():
+                    if row is not None:
+                        results[link] = ranked.get(row, [])
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats["queries"] += 1
+        self.stats["query_ms_total"] += elapsed_ms
+        return results
+
+    def get_stats(self):
+        queries = self.stats["queries"]
+        return {
+            "papers": self.size,
+            "dim": self.dim,
+            "memory_bytes": int(self.vectors.nbytes + self.df.nbytes),
+            **{key: value for key, value in self.stats.items() if key != "query_ms_total"},
+            "avg_query_ms": round(self.stats["query_ms_total"] / queries, 3) if queries else 0.0,
+        }
+
+
+similarity_index = SimilarityIndex()
@@ -0,0 +1,108 @@
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from agents.database import get_db_connection  # type: ignore
+
+GRANULARITIES = ("week", "month")
+
+
+def bucket_for(published, granularity):
+    """Bucket label for an arXiv published timestamp: ISO Monday for weeks, YYYY-MM for months"""
+    day = date.fromisoformat(published[:10])
+    if granularity == "week":
+        return (day - timedelta(days=day.weekday())).isoformat()
+    return day.isoformat()[:7]
+
+
+def record_trend_buckets(cursor, topic, entries):
+    """Fold newly indexed papers into the week/month aggregates.
+
+    entries is a list of (published, terms) for papers seen for the first time,
+    so each paper is only ever counted once.
+    """
+    paper_counts = Counter()
+    term_counts = Counter()
+    for published, terms in entries:
+        for granularity in GRANULARITIES:
+            bucket = bucket_for(published, granularity)
+            paper_counts[(granularity, bucket)] += 1
+            for term in set(terms):
+                term_counts[(granularity, bucket, term)] += 1
+
+    cursor.executemany(
+        "INSERT INTO trend_buckets (topic, granularity, bucket, papers) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(topic, granularity, bucket) DO UPDATE SET papers = papers + excluded.papers",
+        [(topic, g, b, n) for (g, b), n in paper_counts.items()]
+    )
+    cursor.executemany(
+        "INSERT INTO term_buckets (topic, granularity, bucket, term, count) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(topic, granularity, bucket, term) DO UPDATE SET count = count + excluded.count",
+        [(topic, g, b, t, n) for (g, b, t), n in term_counts.items()]
+    )
+
+
+def compute_trends(topic, granularity="month", periods=4, k=10, min_count=2):
+    """Rank rising and declining terms in the latest bucket against the preceding ones.
+
+    Counts are document frequencies normalized by the number of papers in each
+    bucket, with add-one smoothing so terms that are new or disappear still get
+    a finite growth rate.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {GRANULARITIES}")
+    topic = topic.strip().lower()
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT bucket, papers FROM trend_buckets WHERE topic=? AND granularity=? "
+            "ORDER BY bucket DESC LIMIT ?",
+            (topic, granularity, periods)
+        )
+        buckets = [(row["bucket"], row["papers"]) for row in cursor.fetchall()][::-1]
+        if not buckets:
+            return {"topic": topic, "granularity": granularity, "buckets": [], "rising": [], "declining": []}
+
+        cursor.execute(
+            "SELECT bucket, term, count FROM term_buckets WHERE topic=? AND granularity=? AND bucket >= ?",
+            (topic, granularity, buckets[0][0])
+        )
+        series = defaultdict(dict)
+        for row in cursor.fetchall():
+            series[row["term"]][row["bucket"]] = row["count"]
+    finally:
+        conn.close()
+
+    if len(buckets) < 2:
+        # Growth needs at least one earlier bucket to compare against
+        return {"topic": topic, "granularity": granularity,
+                "buckets": [{"bucket": b, "papers": n} for b, n in buckets], "rising": [], "declining": []}
+
+    current_bucket, current_papers = buckets[-1]
+    baseline_papers = sum(n for _, n in buckets[:-1])
+
+    scored = []
+    for term, counts in series.items():
+        current = counts.get(current_bucket, 0)
+        baseline = sum(counts.get(b, 0) for b, _ in buckets[:-1])
+        if current + baseline < min_count:
+            continue
+        current_rate = (current + 1) / (current_papers + 1)
+        baseline_rate = (baseline + 1) / (baseline_papers + 1)
+        scored.append({
+            "term": term,
+            "current": current,
+            "baseline": baseline,
+            "growth": round(current_rate / baseline_rate - 1, 4),
+            "series": [counts.get(b, 0) for b, _ in buckets],
+        })
+
+    rising = sorted((t for t in scored if t["growth"] > 0), key=lambda t: (-t["growth"], -t["current"]))
+    declining = sorted((t for t in scored if t["growth"] < 0), key=lambda t: (t["growth"], -t["baseline"]))
+    return {
+        "topic": topic,
+        "granularity": granularity,
+        "buckets": [{"bucket": b, "papers": n} for b, n in buckets],
+        "rising": rising[:k],
+        "declining": declining[:k],
+    }
@@ -1,16 +1,37 @@
 import asyncio
 import os
 import json
+import random
+import re
+import time
+import zlib
+from datetime import date, datetime
+from typing import List
 from fastapi import FastAPI, Form, Query, Request, HTTPException # type: ignore
-from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse # type: ignore
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse # type: ignore
 from fastapi.staticfiles import StaticFiles # type: ignore
 from starlette.middleware.sessions import SessionMiddleware # type: ignore
 from fastapi.middleware.cors import CORSMiddleware # type: ignore
-from agents.research_agent import fetch_arxiv_papers
-from agents.analysis_agent import analyze_papers
-from agents.innovation_agent import generate_research_idea, format_innovation_proposal
-from agents.innovation_agent import save_proposal_as_markdown  # type: ignore
-from agents.database import init_db, get_db_connection
+from agents.research_agent import fetch_arxiv_papers, afetch_arxiv_papers, stream_arxiv_papers, arxiv_client
+from agents.research_agent import get_cache_stats, CACHE_TTL_SECONDS, ARXIV_PAGE_SIZE
+from agents.analysis_agent import analyze_papers, top_keywords, top_indexed_terms
+from agents.trends import compute_trends
+from agents.search import search_papers, search_proposals
+from agents.similarity import similarity_index
+from agents.config import config_service
+from agents.message_bus import bus
+from agents.metrics import metrics, TimingMiddleware, enable_profiler
+from agents.leader import LeaderElection
+from agents.pipeline import run_pipeline, StageError
+from agents.batch import start_batch_job, get_batch_job, stream_batch_job, BatchJobLimitError
+from agents.innovation_agent import format_innovation_proposal
+from agents.innovation_agent import get_llm_cache_stats, warm_llm_cache_from_proposals
+from agents.innovation_agent import astream_research_idea, agenerate_research_idea, ProposalStreamFormatter
+from agents.innovation_agent import llm_gateway, LLMGatewayError, get_llm, LLM_PRELOAD, agenerate_chat_reply
+from agents.conversation import build_context, get_chat_history, compact_chat_history, get_context_stats
+from agents.innovation_agent import iter_proposals_markdown  # type: ignore
+from agents.database import init_db, get_db_connection, get_user_id, save_chat_message, save_proposal, schema_version
+from agents.database import run_db, db_execute, agent_logger, log_agent_action, get_agent_logs, get_pool
 from fastapi.responses import RedirectResponse  # type: ignore
 from fastapi import Request   # type: ignore
 from starlette.concurrency import run_in_threadpool # type: ignore
@@ -29,9 +50,24 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Added last so it wraps every other middleware and times the whole request
+app.add_middleware(TimingMiddleware)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+LLM_BUSY_MESSAGE = "⏳ The research assistant is busy right now. Please try again in a moment."
+CHAT_HELP_MESSAGE = (
+    "I'm a research assistant. You can ask me to:\n"
+    "- Find recent research papers\n"
+    "- Generate research proposals\n"
+    "- Analyze trends in a field"
+)
+
+@app.exception_handler(LLMGatewayError)
+async def llm_gateway_error_handler(request: Request, exc: LLMGatewayError):
+    headers = {"Retry-After": str(int(exc.retry_after))} if exc.retry_after else None
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)}, headers=headers)
+
 @app.get("/static/index.html", include_in_schema=False)
 def static_index(request: Request):
     if "user" not in request.session:
@@ -105,17 +141,11 @@ def register(username: str = Form(...), password: str = Form(...)):
 
 # === Config Handling ===
 
-CONFIG_FILE = "config.json"
-
 def load_config():
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "r") as f:
-            return json.load(f)
-    return {"topic": "AI", "max_results": 5}
+    return config_service.get()
 
 def save_config(cfg):
-    with open(CONFIG_FILE, "w") as f:
-        json.dump(cfg, f)
+    config_service.set(cfg)
 
 
 @app.post("/set-config")
@@ -128,48 +158,207 @@ def set_config(request: Request, topic: str = Form(...), max_results: int = Form
 
     config = {"topic": topic, "max_results": int(max_results)}
     save_config(config)
+    log_agent_action("api", "set_config", {"user": request.session["user"], **config})
     return {"message": "✅ Config updated", "config": config}
 
 # === Background Task ===
 
-fetched_papers_background = []
+BACKGROUND_INTERVAL_SECONDS = 10
+BACKGROUND_JITTER_SECONDS = 2
+BACKGROUND_MAX_BACKOFF_SECONDS = 300
+CHAT_COMPACT_INTERVAL_SECONDS = 3600
+
+background_status = {
+    "topic": None,
+    "max_results": None,
+    "last_refresh": None,
+    "last_duration_ms": None,
+    "last_error": None,
+    "consecutive_errors": 0,
+}
+
+# With several uvicorn workers only the lease holder fetches; the others read paper_cache
+background_leader = LeaderElection("background_fetcher", info=lambda: background_status)
 
 async def fetch_papers_loop():
-    global fetched_papers_background
+    """Keep the configured topic warm without blocking the event loop"""
+    last_key = None
+    last_fetch = 0.0
+
+    # Wake up as soon as the config changes instead of waiting for the next tick
+    loop = asyncio.get_running_loop()
+    config_changed_event = asyncio.Event()
+    config_service.subscribe(lambda old, new: loop.call_soon_threadsafe(config_changed_event.set))
+
     while True:
+        delay = BACKGROUND_INTERVAL_SECONDS
         try:
             config = load_config()
             topic = config.get("topic", "AI")
             max_results = config.get("max_results", 5)
-            papers = fetch_arxiv_papers(topic=topic, max_results=max_results)
-            fetched_papers_background = papers
-            print(f"[Background] ✅ Fetched {len(papers)} papers for topic: {topic}")
+            key = (topic, max_results)
+            config_changed = key != last_key
+            expired = time.time() - last_fetch >= CACHE_TTL_SECONDS
+
+            if not background_leader.is_leader:
+                # On taking over, start from whatever the previous leader left in the cache
+                last_key = None
+            elif config_changed or expired:
+                started = time.perf_counter()
+                # A new topic may already be warm in the cache; an expired one must hit arXiv
+                papers = await run_in_threadpool(
+                    fetch_arxiv_papers, topic=topic, max_results=max_results, use_cache=config_changed
+                )
+                last_key, last_fetch = key, time.time()
+                background_status.update({
+                    "topic": topic,
+                    "max_results": max_results,
+                    "last_refresh": datetime.utcnow().isoformat() + "Z",
+                    "last_duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                    "last_error": None,
+                })
+                print(f"[Background] ✅ Fetched {len(papers)} papers for topic: {topic}")
+            background_status["consecutive_errors"] = 0
+        except Exception as e:
+            background_status["consecutive_errors"] += 1
+            background_status["last_error"] = str(e)
+            delay = min(
+                BACKGROUND_INTERVAL_SECONDS * 2 ** background_status["consecutive_errors"],
+                BACKGROUND_MAX_BACKOFF_SECONDS,
+            )
+            print(f"[Background Error] ❌ {e} (retrying in {delay}s)")
+        try:
+            await asyncio.wait_for(config_changed_event.wait(), delay + random.uniform(0, BACKGROUND_JITTER_SECONDS))
+        except asyncio.TimeoutError:
+            pass
+        config_changed_event.clear()
+
+async def compact_chat_loop():
+    """Archive old chat turns every CHAT_COMPACT_INTERVAL_SECONDS; the background leader does it for all workers"""
+    while True:
+        await asyncio.sleep(CHAT_COMPACT_INTERVAL_SECONDS)
+        if not background_leader.is_leader:
+            continue
+        try:
+            await run_db(compact_chat_history)
         except Exception as e:
-            print(f"[Background Error] ❌ {e}")
-        await asyncio.sleep(10)
+            print(f"[Chat] ❌ Compaction failed: {e}")
+
+metrics.register_collector("paper_cache", get_cache_stats)
+metrics.register_collector("arxiv", lambda: arxiv_client.stats)
+metrics.register_collector("llm_cache", get_llm_cache_stats)
+metrics.register_collector("llm_gateway", llm_gateway.get_stats)
+metrics.register_collector("bus", bus.get_stats)
+metrics.register_collector("similarity", similarity_index.get_stats)
+metrics.register_collector("agent_log", agent_logger.get_stats)
+metrics.register_collector("config", lambda: config_service.stats)
+metrics.register_collector("background", lambda: background_status)
+metrics.register_collector("chat_context", get_context_stats)
+metrics.register_collector("database", lambda: {"schema_version": schema_version()})
 
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    profiler = enable_profiler()
+    if profiler:
+        print(f"[Metrics] ✅ Profiling requests slower than {profiler.threshold * 1000:.0f} ms")
+    warmed = await run_db(warm_llm_cache_from_proposals)
+    print(f"[LLM Cache] ✅ Warmed {warmed} entries from proposals")
+    await run_db(bus.replay)
+    if LLM_PRELOAD:
+        # Pay the LangChain/Groq import here rather than in the first proposal request
+        await run_in_threadpool(get_llm)
+    # Settle leadership before the first tick so the leader fetches immediately
+    await run_in_threadpool(background_leader.renew)
+    asyncio.create_task(background_leader.run())
     asyncio.create_task(fetch_papers_loop())
+    asyncio.create_task(compact_chat_loop())
+    asyncio.create_task(run_in_threadpool(similarity_index.rebuild_from_cache))
+
+@app.on_event("shutdown")
+def shutdown_event():
+    # Hand the background fetcher to another worker right away instead of after the lease expires
+    background_leader.stop()
+    arxiv_client.close()
+    agent_logger.stop()
+    get_pool().close_all()
+
+async def run_agent_pipeline(topic: str, max_results: int, user: str = None):
+    """Run the agent pipeline for a comma-separated topic list, mapping stage failures to HTTP errors"""
+    try:
+        return await run_pipeline(topic.split(","), max_results, user=user)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except StageError as e:
+        if isinstance(e.__cause__, LLMGatewayError):
+            raise e.__cause__
+        raise HTTPException(status_code=504 if e.timed_out else 502, detail=str(e))
 
 @app.get("/run-agents")
-def run_agents(request: Request, topic: str = Query("gen ai"), max_results: int = Query(5)):
+async def run_agents(request: Request, topic: str = Query("gen ai"), max_results: int = Query(5)):
     check_auth(request)
 
-    from agents.research_agent import fetch_arxiv_papers
-    from agents.analysis_agent import analyze_from_bus
-    from agents.innovation_agent import generate_from_bus
-    print("[RUN AGENTS] ✅ Papers, keywords, and proposal generated")
+    result = await run_agent_pipeline(topic, max_results)
+    print(f"[RUN AGENTS] ✅ Papers, keywords, and proposal generated in {result['timings_ms']['total']} ms")
 
-    fetch_arxiv_papers(topic, max_results)
-    analyze_from_bus()
-    proposal = generate_from_bus()
-
-    return {"topic": topic, "proposal": proposal}
+    return {"topic": topic, "proposal": result["proposal"], "keywords": result["keywords"], "timings_ms": result["timings_ms"]}
 
 # === API Endpoints ===
 
+@app.get("/background-status")
+def get_background_status(request: Request):
+    check_auth(request)
+    leadership = background_leader.get_status()
+    leader_status = leadership.pop("info")
+    # Followers report what the leader published with its last lease renewal
+    status = background_status if leadership["is_leader"] or leader_status is None else leader_status
+    return {**status, "leader": leadership}
+
+@app.get("/agent-logs")
+def agent_logs(
+    request: Request,
+    agent: str = Query(None),
+    action: str = Query(None),
+    before_id: int = Query(None),
+    limit: int = Query(100, ge=1, le=500),
+):
+    check_auth(request)
+    logs = get_agent_logs(agent_name=agent, action_type=action, before_id=before_id, limit=limit)
+    return {
+        "logs": logs,
+        "next_before_id": logs[-1]["id"] if len(logs) == limit else None,
+        "writer": agent_logger.get_stats(),
+    }
+
+@app.get("/bus-stats")
+def bus_stats(request: Request):
+    check_auth(request)
+    return bus.get_stats()
+
+@app.get("/llm-stats")
+def llm_stats(request: Request):
+    check_auth(request)
+    return {"gateway": llm_gateway.get_stats(), "cache": get_llm_cache_stats()}
+
+@app.get("/cache-stats")
+def cache_stats(request: Request):
+    check_auth(request)
+    return {**get_cache_stats(), "upstream": arxiv_client.stats, "llm": get_llm_cache_stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus text exposition: request/span latency histograms and component counters"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/slow-requests")
+def slow_requests(request: Request):
+    """Slowest recent requests with their span breakdown and most-sampled stacks (needs SLOW_REQUEST_MS)"""
+    check_auth(request)
+    if metrics.profiler is None:
+        raise HTTPException(status_code=404, detail="Slow-request profiling is off; set SLOW_REQUEST_MS to enable it")
+    return {"threshold_ms": metrics.profiler.threshold * 1000, **metrics.profiler.stats,
+            "requests": metrics.profiler.slowest()}
+
 def check_auth(request: Request):
     if "user" not in request.session:
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -181,49 +370,148 @@ def fetch_papers(request: Request, topic: str = Query("AI"), max_results: int =
     return {"topic": topic, "results": papers}
 
 @app.get("/analyze")
-def analyze(request: Request, topic: str = Query("AI"), max_results: int = Query(5)):
+def analyze(
+    request: Request,
+    topic: str = Query("AI"),
+    # Each page past the first waits ARXIV_PAGE_DELAY_SECONDS on a worker thread, so sweeps are capped
+    max_results: int = Query(5, ge=1, le=2000),
+    top_k: int = Query(5, ge=1, le=100),
+    scoring: str = Query("count"),
+    bigrams: bool = Query(False),
+    source: str = Query("fetch"),
+):
     check_auth(request)
+    if scoring not in ("count", "tfidf"):
+        raise HTTPException(status_code=400, detail="scoring must be 'count' or 'tfidf'")
+    if source == "index":
+        # Answered from the incrementally maintained term index, no refetch or recount
+        return {"topic": topic, "top_keywords": top_indexed_terms(topic, k=top_k)}
     try:
-        papers = fetch_arxiv_papers(topic=topic, max_results=max_results)
-
-        if len(papers) > 20:
-            papers = papers[:20]  
-        keywords = analyze_papers(papers)
+        if max_results > ARXIV_PAGE_SIZE:
+            # Large sweeps are parsed page by page so counting starts on the first page
+            papers = stream_arxiv_papers(topic=topic, max_results=max_results)
+        else:
+            papers = fetch_arxiv_papers(topic=topic, max_results=max_results)
+        keywords = top_keywords(papers, k=top_k, scoring=scoring, bigrams=bigrams)
         return {"topic": topic, "top_keywords": keywords}
     except Exception as e:
         import traceback
         print("🚨 [Analyze Error]", traceback.format_exc())
         raise HTTPException(status_code=500, detail="Error during keyword analysis")
 
-@app.get("/innovate")
-def innovate(request: Request, topic: str = Query("AI"), max_results: int = Query(5)):
+@app.get("/search")
+def search(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    scope: str = Query("all"),
+    topic: str = Query(None),
+    limit: int = Query(10, ge=1, le=50),
+):
+    """Full-text search over cached papers and the user's own proposals"""
     check_auth(request)
+    if scope not in ("all", "papers", "proposals"):
+        raise HTTPException(status_code=400, detail="scope must be all, papers or proposals")
+
+    started = time.perf_counter()
+    result = {"query": q}
+    if scope in ("all", "papers"):
+        result["papers"] = search_papers(q, limit=limit, topic=topic)
+    if scope in ("all", "proposals"):
+        result["proposals"] = search_proposals(get_user_id(request.session["user"]), q, limit=limit)
+    result["took_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+@app.get("/related")
+def related(request: Request, link: List[str] = Query(...), k: int = Query(10, ge=1, le=50)):
+    """Most similar cached papers for one or more arXiv links (repeat link= for a batch)"""
+    check_auth(request)
+    if len(link) > 50:
+        raise HTTPException(status_code=400, detail="At most 50 links per request")
+
+    results = similarity_index.related(link, k=k)
+    if all(r is None for r in results.values()):
+        raise HTTPException(status_code=404, detail="Paper not indexed yet")
+    return {"results": results, "index": similarity_index.get_stats()}
+
+@app.get("/trends")
+def trends(
+    request: Request,
+    topic: str = Query("AI"),
+    max_results: int = Query(5),
+    granularity: str = Query("month"),
+    periods: int = Query(4, ge=2, le=52),
+    top_k: int = Query(10, ge=1, le=100),
+):
+    check_auth(request)
+    if granularity not in ("week", "month"):
+        raise HTTPException(status_code=400, detail="granularity must be 'week' or 'month'")
+    # Ingesting goes through the cache, so this only hits arXiv for a cold topic
+    fetch_arxiv_papers(topic=topic, max_results=max_results)
+    return compute_trends(topic, granularity=granularity, periods=periods, k=top_k)
 
-    papers = fetch_arxiv_papers(topic=topic, max_results=max_results)
-    keywords = [kw for kw, _ in analyze_papers(papers)]
-    raw = generate_research_idea(keywords)
-    formatted = format_innovation_proposal(raw)
+@app.get("/innovate")
+async def innovate(request: Request, topic: str = Query("AI"), max_results: int = Query(5)):
+    check_auth(request)
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        INSERT INTO proposals (user_id, topic, keywords, proposal_text)
-        VALUES ((SELECT id FROM users WHERE username = ?), ?, ?, ?)
-        """,
-        (request.session["user"], topic, json.dumps(keywords), raw)
-    )
-    proposal_id = cursor.lastrowid 
-    conn.commit()
-    conn.close()
+    result = await run_agent_pipeline(topic, max_results, user=request.session["user"])
+    log_agent_action("api", "innovate", {"user": request.session["user"], "topic": topic, "proposal_id": result["proposal_id"]})
 
     return {
         "topic": topic,
-        "proposal": formatted,
-        "proposal_id": proposal_id  
+        "proposal": result["formatted"],
+        "proposal_id": result["proposal_id"],
+        "timings_ms": result["timings_ms"]
+    }
+
+
+
+@app.post("/innovate/batch", status_code=202)
+async def innovate_batch(request: Request, data: dict):
+    """Start proposal generation for a list of topics; poll or stream the returned job"""
+    check_auth(request)
+
+    topics = data.get("topics")
+    if not isinstance(topics, list):
+        raise HTTPException(status_code=400, detail="topics must be a list of strings")
+    try:
+        max_results = int(data.get("max_results", 5))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="max_results must be an integer")
+    try:
+        job = await start_batch_job(request.session["user"], [str(t) for t in topics], max_results)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except BatchJobLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    return {
+        "job_id": job.id,
+        "topics": job.topics,
+        "status_url": f"/innovate/batch/{job.id}",
+        "stream_url": f"/innovate/batch/{job.id}/stream"
     }
 
+@app.get("/innovate/batch/{job_id}")
+def innovate_batch_status(request: Request, job_id: str):
+    check_auth(request)
+    job = get_batch_job(job_id, request.session["user"])
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/innovate/batch/{job_id}/stream")
+def innovate_batch_stream(request: Request, job_id: str):
+    """Server-Sent Events with one event per finished topic and a final summary"""
+    check_auth(request)
+    job = get_batch_job(job_id, request.session["user"])
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for event in stream_batch_job(job_id):
+            yield sse_event(event)
 
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.get("/chat-ui", response_class=HTMLResponse)
 async def chat_ui(request: Request):
@@ -241,27 +529,93 @@ async def handle_chat(request: Request, data: dict):
     if not message:
         raise HTTPException(status_code=400, detail="Empty message")
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO chat_history (user_id, message, is_user) VALUES ("
-        "(SELECT id FROM users WHERE username=?), ?, 1)",
-        (user, message)
-    )
-    conn.commit()
+    await run_db(save_chat_message, user, message, True)
     
     response, proposal_id = await process_with_agents(user, message)
     
-    cursor.execute(
-        "INSERT INTO chat_history (user_id, message, is_user) VALUES ("
-        "(SELECT id FROM users WHERE username=?), ?, 0)",
-        (user, response)
-    )
-    conn.commit()
-    conn.close()
+    await run_db(save_chat_message, user, response, False)
+    log_agent_action("api", "chat", {"user": user, "intent": chat_intent(message.lower()), "proposal_id": proposal_id})
     
     return {"response": response, "proposal_id": proposal_id}
 
+def sse_event(payload: dict) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
+async def stream_chat_events(username: str, message: str):
+    """Server-Sent Events for one chat turn; proposals are streamed line by line as the LLM writes them"""
+    if chat_intent(message.lower()) != "proposal":
+        response, proposal_id = await process_with_agents(username, message)
+        await run_db(save_chat_message, username, response, False)
+        yield sse_event({"type": "delta", "text": response})
+        yield sse_event({"type": "done", "proposal_id": proposal_id})
+        return
+
+    config = load_config()
+    papers = await afetch_arxiv_papers(topic=config["topic"], max_results=config.get("max_results", 5))
+    keywords = await run_in_threadpool(analyze_papers, papers) if papers else []
+    if not keywords or len(keywords) < 2:
+        response = "❌ Not enough keywords extracted to generate a meaningful proposal."
+        await run_db(save_chat_message, username, response, False)
+        yield sse_event({"type": "delta", "text": response})
+        yield sse_event({"type": "done", "proposal_id": None})
+        return
+
+    formatter = ProposalStreamFormatter()
+    raw_parts = []
+    formatted_parts = []
+    try:
+        async for chunk in astream_research_idea(keywords, user=username):
+            raw_parts.append(chunk)
+            text = formatter.feed(chunk)
+            if text:
+                formatted_parts.append(text)
+                yield sse_event({"type": "delta", "text": text})
+        text = formatter.flush()
+        if text:
+            formatted_parts.append(text)
+            yield sse_event({"type": "delta", "text": text})
+    except LLMGatewayError:
+        yield sse_event({"type": "error", "text": LLM_BUSY_MESSAGE})
+        return
+    except Exception as e:
+        print("❌ Innovation streaming failed:", e)
+        yield sse_event({"type": "error", "text": "❌ Failed to generate proposal. Please try again with a broader topic."})
+        return
+
+    proposal = "".join(raw_parts).strip()
+    proposal_id = await run_db(save_proposal, username, config["topic"], keywords, proposal)
+    await run_db(save_chat_message, username, "".join(formatted_parts), False)
+    yield sse_event({"type": "done", "proposal_id": proposal_id})
+
+@app.post("/chat/stream")
+async def handle_chat_stream(request: Request, data: dict):
+    """Streaming variant of /chat that pushes the reply as Server-Sent Events"""
+    user = request.session.get("user")
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    message = data.get("message", "").strip()
+    if not message:
+        raise HTTPException(status_code=400, detail="Empty message")
+
+    await run_db(save_chat_message, user, message, True)
+    return StreamingResponse(
+        stream_chat_events(user, message),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/chat/history")
+async def chat_history(
+    request: Request,
+    before_id: int = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+):
+    """The user's chat messages, newest first, archived ones included; pass next_before_id back as before_id"""
+    check_auth(request)
+    user_id = await run_db(get_user_id, request.session["user"])
+    return await run_db(get_chat_history, user_id, before_id, limit)
+
 @app.post("/feedback")
 async def handle_feedback(request: Request, data: dict):
     """Store user feedback on proposals"""
@@ -275,32 +629,57 @@ async def handle_feedback(request: Request, data: dict):
     if not proposal_id or rating not in (1, -1):
         raise HTTPException(status_code=400, detail="Invalid feedback data")
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE proposals SET rating=? WHERE id=? AND user_id="
-        "(SELECT id FROM users WHERE username=?)",
-        (rating, proposal_id, user)
+    user_id = await run_db(get_user_id, user)
+    await db_execute(
+        "UPDATE proposals SET rating=? WHERE id=? AND user_id=?",
+        (rating, proposal_id, user_id)
     )
-    conn.commit()
-    conn.close()
     
     return {"status": "success"}
 
 
+PAPER_INTENT = ["research", "papers", "find", "article", "paper", "about", "ai", "ml", "deep learning", "gen ai"]
+PROPOSAL_INTENT = ["idea", "proposal", "generate", "innovation"]
+TREND_INTENT = ["analyze", "trends", "trend", "pattern", "analysis"]
+SEARCH_SUBJECT_RE = re.compile(r"\b(?:about|on|regarding|related to)\s+(.+)")
+
+def chat_intent(message: str) -> str:
+    """Which agent a lowercased chat message is routed to; earlier intents take precedence"""
+    if any(keyword in message for keyword in PAPER_INTENT):
+        return "papers"
+    if any(keyword in message for keyword in PROPOSAL_INTENT):
+        return "proposal"
+    if any(keyword in message for keyword in TREND_INTENT):
+        return "trends"
+    return "help"
+
 async def process_with_agents(username: str, message: str):
     message = message.lower()
     config = load_config()
     max_results = config.get("max_results", 5)
 
-    if any(keyword in message for keyword in ["research", "papers", "find", "article", "paper", "about", "ai", "ml", "deep learning", "gen ai"]):
-        papers = await run_in_threadpool(fetch_arxiv_papers, topic=config["topic"], max_results=max_results)
+    intent = chat_intent(message)
+
+    if intent == "papers":
+        # "find papers about X": answer from the local index first, then fall back to arXiv for X
+        subject = SEARCH_SUBJECT_RE.search(message)
+        topic = subject.group(1).strip(" ?.!") if subject else ""
+        if topic:
+            hits = await run_db(search_papers, topic, max_results)
+            if hits:
+                response = f"I found {len(hits)} papers about {topic} that I've seen before:\n"
+                response += "\n".join(f"- {p['title']}" for p in hits)
+                return response, None
+        else:
+            topic = config["topic"]
+
+        papers = await afetch_arxiv_papers(topic=topic, max_results=max_results)
         response = f"I found {len(papers)} recent papers:\n"
         response += "\n".join(f"- {p['title']}" for p in papers)
         return response, None
 
-    elif any(keyword in message for keyword in ["idea", "proposal", "generate", "innovation"]):
-        papers = await run_in_threadpool(fetch_arxiv_papers, topic=config["topic"], max_results=max_results)
+    elif intent == "proposal":
+        papers = await afetch_arxiv_papers(topic=config["topic"], max_results=max_results)
         
         if not papers:
             return "❌ No papers found to generate a proposal.", None
@@ -311,57 +690,86 @@ async def process_with_agents(username: str, message: str):
             return "❌ Not enough keywords extracted to generate a meaningful proposal.", None
 
         try:
-            proposal = await run_in_threadpool(generate_research_idea, keywords)
+            proposal = await agenerate_research_idea(keywords, user=username)
             formatted = await run_in_threadpool(format_innovation_proposal, proposal)
+        except LLMGatewayError:
+            return LLM_BUSY_MESSAGE, None
         except Exception as e:
             print("❌ Innovation generation failed:", e)
             return "❌ Failed to generate proposal. Please try again with a broader topic.", None
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO proposals (user_id, topic, keywords, proposal_text) VALUES ("
-            "(SELECT id FROM users WHERE username=?), ?, ?, ?)",
-            (username, config["topic"], json.dumps(keywords), proposal)
-        )
-        proposal_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        proposal_id = await run_db(save_proposal, username, config["topic"], keywords, proposal)
 
         return formatted, proposal_id
 
 
-    elif any(keyword in message for keyword in ["analyze", "trends", "trend", "pattern", "analysis"]):
-        papers = await run_in_threadpool(fetch_arxiv_papers, topic=config["topic"], max_results=max_results)
-        keywords = await run_in_threadpool(analyze_papers, papers)
+    elif intent == "trends":
+        # Make sure the configured topic has been ingested, then read counts from the index
+        await afetch_arxiv_papers(topic=config["topic"], max_results=max_results)
+        keywords = await run_in_threadpool(top_indexed_terms, config["topic"], 5)
         response = "Top keywords and trends:\n" + "\n".join(f"- {k[0]} ({k[1]})" for k in keywords)
         return response, None
 
     else:
-        return (
-            "I'm a research assistant. You can ask me to:\n"
-            "- Find recent research papers\n"
-            "- Generate research proposals\n"
-            "- Analyze trends in a field"
-        ), None
-
+        # Anything else is conversation: answer from the recent turns and the rolling summary
+        user_id = await run_db(get_user_id, username)
+        context = await run_db(build_context, user_id)
+        try:
+            reply = await agenerate_chat_reply(context["messages"], user=username)
+        except LLMGatewayError:
+            return LLM_BUSY_MESSAGE, None
+        except Exception as e:
+            print("❌ Chat reply failed:", e)
+            reply = None
+        return reply or CHAT_HELP_MESSAGE, None
+
+
+def gzip_chunks(chunks):
+    """Compress a byte stream on the fly as a single gzip member"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def markdown_download(chunks, filename: str, compress: bool):
+    headers = {"Content-Disposition": f'attachment; filename="{filename}{".gz" if compress else ""}"'}
+    if compress:
+        return StreamingResponse(gzip_chunks(chunks), media_type="application/gzip", headers=headers)
+    return StreamingResponse(chunks, media_type="text/markdown; charset=utf-8", headers=headers)
 
 @app.get("/export-report")
-def export_report(request: Request):
+def export_report(request: Request, gzip: bool = Query(False)):
     check_auth(request)
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT topic, keywords, proposal_text FROM proposals WHERE user_id=(SELECT id FROM users WHERE username=?) ORDER BY id DESC LIMIT 1",
-        (request.session["user"],)
-    )
-    row = cursor.fetchone()
-    conn.close()
+    user_id = get_user_id(request.session["user"])
+    chunks = iter_proposals_markdown(user_id, limit=1)
+    if chunks is None:
+        raise HTTPException(status_code=404, detail="No proposals found")
 
-    if not row:
+    return markdown_download(chunks, "latest_proposal.md", gzip)
+
+@app.get("/export-proposals")
+def export_proposals(
+    request: Request,
+    topic: str = Query(None),
+    since: str = Query(None),
+    until: str = Query(None),
+    gzip: bool = Query(False),
+):
+    """All of the user's proposals as one Markdown document, optionally filtered by topic and date (YYYY-MM-DD)"""
+    check_auth(request)
+    for value in (since, until):
+        if value:
+            try:
+                date.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="since/until must be YYYY-MM-DD dates")
+
+    user_id = get_user_id(request.session["user"])
+    chunks = iter_proposals_markdown(user_id, topic=topic, since=since, until=until)
+    if chunks is None:
         raise HTTPException(status_code=404, detail="No proposals found")
 
-    topic, keywords, proposal_text = row
-    filename = save_proposal_as_markdown(topic, json.loads(keywords), proposal_text)
-    return FileResponse(filename, media_type='text/markdown', filename="latest_proposal.md")
+    return markdown_download(chunks, "proposals.md", gzip)
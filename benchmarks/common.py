@@ -0,0 +1,97 @@
+"""Shared setup and reporting for the benchmark scripts."""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+APP_DIR = REPO_DIR / "adaptive_agent"
+
+
+def prepare_app_environment(workdir=None):
+    """Run the app from a scratch directory so benchmarks never touch the real data.db or config.json.
+
+    The app resolves data.db, config.json and static/ relative to the working
+    directory (the database path is fixed at import), so this must run before
+    anything from agents/ or main is imported.
+    """
+    workdir = Path(workdir or tempfile.mkdtemp(prefix="adaptive-agent-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    static = workdir / "static"
+    if not static.exists():
+        static.symlink_to(APP_DIR / "static", target_is_directory=True)
+    os.chdir(workdir)
+    if str(APP_DIR) not in sys.path:
+        sys.path.insert(0, str(APP_DIR))
+    os.environ.setdefault("LLM_RATE_PER_MINUTE", "0")  # the fake LLM has no provider quota
+    return workdir
+
+
+def summarize(samples_ms, elapsed_s=None):
+    """Latency percentiles (ms) and throughput for a list of per-call timings"""
+    if not samples_ms:
+        return {"count": 0}
+    ordered = sorted(samples_ms)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 3)
+
+    elapsed_s = elapsed_s if elapsed_s is not None else sum(samples_ms) / 1000
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "max_ms": round(ordered[-1], 3),
+        "throughput_per_s": round(len(ordered) / elapsed_s, 2) if elapsed_s else None,
+    }
+
+
+def rss_mb(pid=None):
+    """Resident set size of a process in MB (Linux /proc); falls back to this process's peak RSS"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if pid is None:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    return None
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_report(kind, config, results, output=None):
+    report = {
+        "kind": kind,
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": config,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        Path(output).write_text(text + "\n")
+        print(f"Wrote {output}")
+    else:
+        print(text)
+    return report
@@ -0,0 +1,52 @@
+"""Diff two benchmark reports from micro.py, load.py or import_time.py:
+
+    python benchmarks/compare.py before.json after.json
+"""
+import argparse
+import json
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "throughput_per_s", "errors", "rss_mb_after", "cumulative_ms")
+LOWER_IS_BETTER = {"p50_ms", "p95_ms", "p99_ms", "errors", "rss_mb_after", "cumulative_ms"}
+
+
+def compare(before, after, threshold):
+    rows = []
+    for name, old in before["results"].items():
+        new = after["results"].get(name)
+        if not isinstance(old, dict) or not isinstance(new, dict):
+            continue
+        for metric in METRICS:
+            if metric not in old or metric not in new or old[metric] is None or new[metric] is None:
+                continue
+            change = (new[metric] - old[metric]) / old[metric] * 100 if old[metric] else 0.0
+            worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+            better = change < -threshold if metric in LOWER_IS_BETTER else change > threshold
+            rows.append((name, metric, old[metric], new[metric], change, "worse" if worse else "better" if better else ""))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change worth flagging")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    if before.get("kind") != after.get("kind"):
+        parser.error(f"cannot compare a {before.get('kind')} report with a {after.get('kind')} report")
+
+    print(f"{before.get('revision')} -> {after.get('revision')} ({before['kind']})")
+    rows = compare(before, after, args.threshold)
+    for name, metric, old, new, change, verdict in rows:
+        print(f"{name:<36} {metric:<18} {old:>12.3f} {new:>12.3f} {change:>+8.1f}%  {verdict}")
+    regressions = sum(1 for row in rows if row[-1] == "worse")
+    print(f"{regressions} metric(s) worse by more than {args.threshold:.0f}%")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,218 @@
+"""Local stand-ins for the arXiv API and Groq so benchmarks run offline and repeatably."""
+import asyncio
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+VOCABULARY = """
+adaptive adversarial agent alignment attention autoencoder bayesian benchmark causal classifier
+clustering compression contrastive convolutional curriculum dataset decoder diffusion distillation
+distributed embedding encoder ensemble evaluation explainable federated finetuning forecasting
+generative gradient graph hallucination heterogeneous hierarchical inference interpretability
+kernel knowledge language latent learning manifold meta molecular multimodal network neural
+optimization planning policy pretraining privacy probabilistic pruning quantization quantum
+reasoning recommendation recurrent reinforcement representation retrieval reward robotics
+robustness sampling segmentation semantic sequence simulation sparse spectral speech stochastic
+supervision surrogate symbolic synthesis temporal tensor tokenizer topology transfer transformer
+uncertainty variational vision weather
+""".split()
+
+FEED_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom">\n'
+FEED_FOOTER = "</feed>\n"
+
+
+def synthetic_entry(rng, index, summary_words=120):
+    title = " ".join(rng.choice(VOCABULARY) for _ in range(8)).capitalize()
+    summary = " ".join(rng.choice(VOCABULARY) for _ in range(summary_words)) + "."
+    published = f"20{rng.randint(20, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00Z"
+    link = f"http://arxiv.org/abs/{2000 + index // 100000}.{index % 100000:05d}v{rng.randint(1, 3)}"
+    return (
+        "<entry>"
+        f"<title>{escape(title)}</title>"
+        f"<summary>{escape(summary)}</summary>"
+        f"<published>{published}</published>"
+        f'<link href="{link}" rel="alternate" type="text/html"/>'
+        "</entry>\n"
+    )
+
+
+def synthetic_feed(n, topic="ai", start=0, summary_words=120):
+    """Atom feed bytes with n entries; the same (topic, start, n) always yields the same feed"""
+    parts = [FEED_HEADER]
+    for i in range(start, start + n):
+        rng = random.Random(f"{topic}:{i}")
+        parts.append(synthetic_entry(rng, i, summary_words))
+    parts.append(FEED_FOOTER)
+    return "".join(parts).encode("utf-8")
+
+
+class FakeArxivServer:
+    """Serves synthetic Atom feeds on a local port, shaped like export.arxiv.org/api/query.
+
+    latency adds a fixed delay per request; total_results caps how many
+    entries exist per topic so paging terminates.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, total_results=10000, summary_words=120):
+        self.latency = latency
+        self.total_results = total_results
+        self.summary_words = summary_words
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/stats":
+                    body = json.dumps({"requests": server.requests}).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                query = parse_qs(url.query)
+                topic = query.get("search_query", ["all:ai"])[0].split(":", 1)[-1].lower()
+                start = int(query.get("start", ["0"])[0])
+                max_results = int(query.get("max_results", ["10"])[0])
+                count = max(0, min(max_results, server.total_results - start))
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                body = synthetic_feed(count, topic, start, server.summary_words)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/atom+xml")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/api/query"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+PROPOSAL_SECTIONS = [
+    "Title", "Introduction", "Research Objectives", "Research Questions",
+    "Methodology", "Expected Outcomes", "Impact", "Timeline", "Conclusion",
+]
+
+
+def synthetic_proposal(keywords, seed=0, sentences_per_section=3):
+    """LLM-shaped proposal text with the bold section headers and numbered lists the formatter handles"""
+    rng = random.Random(f"{seed}:{','.join(keywords)}")
+    words = list(keywords) + VOCABULARY
+    lines = []
+    for section in PROPOSAL_SECTIONS:
+        lines.append(f"**{section}:** " + " ".join(rng.choice(words) for _ in range(6)))
+        for i in range(1, sentences_per_section + 1):
+            sentence = " ".join(rng.choice(words) for _ in range(14))
+            lines.append(f"{i}. **{rng.choice(words).capitalize()}**: {sentence}.")
+        lines.append("")
+    return "\n".join(lines)
+
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeChatGroq:
+    """Drop-in for langchain_groq.ChatGroq with configurable latency and token streaming.
+
+    latency is the time to first token; tokens_per_second paces the rest of
+    the response (0 returns it all at once).
+    """
+
+    def __init__(self, latency=0.5, tokens_per_second=0, chunk_words=4, **kwargs):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.chunk_words = chunk_words
+        self.calls = 0
+
+    def _text(self, messages):
+        prompt = str(messages[-1].content if hasattr(messages[-1], "content") else messages[-1])
+        keywords = prompt.split("Keywords:", 1)[-1].split("\n", 1)[0].strip().split(", ")
+        return synthetic_proposal(keywords)
+
+    def _chunks(self, text):
+        words = text.split(" ")
+        for i in range(0, len(words), self.chunk_words):
+            yield " ".join(words[i:i + self.chunk_words]) + (" " if i + self.chunk_words < len(words) else "")
+
+    def _generation_time(self, text):
+        if not self.tokens_per_second:
+            return 0.0
+        return len(text.split()) / self.tokens_per_second
+
+    def invoke(self, messages, **kwargs):
+        self.calls += 1
+        text = self._text(messages)
+        time.sleep(self.latency + self._generation_time(text))
+        return FakeMessage(text)
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        text = self._text(messages)
+        await asyncio.sleep(self.latency + self._generation_time(text))
+        return FakeMessage(text)
+
+    def stream(self, messages, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        for chunk in self._chunks(self._text(messages)):
+            if self.tokens_per_second:
+                time.sleep(len(chunk.split()) / self.tokens_per_second)
+            yield FakeMessage(chunk)
+
+    async def astream(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        for chunk in self._chunks(self._text(messages)):
+            if self.tokens_per_second:
+                await asyncio.sleep(len(chunk.split()) / self.tokens_per_second)
+            yield FakeMessage(chunk)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve synthetic arXiv Atom feeds")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--total-results", type=int, default=10000)
+    args = parser.parse_args()
+
+    server = FakeArxivServer(port=args.port, latency=args.latency, total_results=args.total_results)
+    print(f"Fake arXiv API on {server.url}", flush=True)
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,94 @@
+"""Startup import cost of the app, per module, from `python -X importtime`.
+
+    python benchmarks/import_time.py --budget-ms 1500 --output imports.json
+
+Imports main in a fresh interpreter (from a scratch directory, with
+GROQ_API_KEY unset) --runs times and keeps each module's fastest run. Exits
+non-zero when importing main takes longer than --budget-ms or pulls in one of
+the --forbid modules, which should only load when first used.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+from common import APP_DIR, prepare_app_environment, write_report
+
+
+def parse_importtime(stderr):
+    """[(module, depth, self_ms, cumulative_ms)] from -X importtime output"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), depth, int(self_us) / 1000, int(cumulative_us) / 1000))
+    return entries
+
+
+def measure(workdir, env):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=workdir, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"import main failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="maximum time to import main")
+    parser.add_argument("--forbid", default="langchain_groq,langchain_core,groq",
+                        help="comma-separated modules that must not be imported at startup")
+    parser.add_argument("--top", type=int, default=15, help="modules to list")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    workdir = prepare_app_environment()
+    env = {key: value for key, value in os.environ.items() if key != "GROQ_API_KEY"}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(APP_DIR), env.get("PYTHONPATH")]))
+
+    best = {}        # module -> (self_ms, cumulative_ms), fastest run
+    reported = set() # what main imports directly, plus every agents.* module
+    imported = set()
+    for _ in range(args.runs):
+        for name, depth, self_ms, cumulative_ms in measure(workdir, env):
+            imported.add(name)
+            if depth <= 1 or name.startswith("agents."):
+                reported.add(name)
+            if name not in best or cumulative_ms < best[name][1]:
+                best[name] = (self_ms, cumulative_ms)
+
+    total_ms = best["main"][1]
+    results = {
+        name: {"self_ms": round(best[name][0], 3), "cumulative_ms": round(best[name][1], 3)}
+        for name in sorted(reported, key=lambda n: -best[n][1])
+    }
+    forbidden = sorted(
+        name for name in imported
+        for root in args.forbid.split(",") if root and (name == root or name.startswith(root + "."))
+    )
+
+    print(f"{'module':<40} {'self ms':>10} {'cumulative ms':>14}")
+    for name, row in list(results.items())[:args.top]:
+        print(f"{name:<40} {row['self_ms']:>10.1f} {row['cumulative_ms']:>14.1f}")
+    print(f"import main: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    config = {"runs": args.runs, "budget_ms": args.budget_ms, "forbid": args.forbid}
+    write_report("imports", config, results, args.output)
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"import main took {total_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+    if forbidden:
+        failures.append(f"imported at startup: {', '.join(sorted(set(n.split('.')[0] for n in forbidden)))}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
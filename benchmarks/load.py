@@ -0,0 +1,213 @@
+"""End-to-end load driver: starts the fake arXiv server and the app (serve.py),
+logs in, and hammers each endpoint with concurrent clients.
+
+Reports p50/p95/p99 latency, throughput, error count and server RSS per
+endpoint as JSON that compare.py can diff:
+
+    python benchmarks/load.py --requests 200 --concurrency 8 --output before.json
+"""
+import argparse
+import itertools
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests  # type: ignore
+
+from common import summarize, rss_mb, write_report
+from fakes import VOCABULARY
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+CHAT_MESSAGES = [
+    "find papers about {topic}",
+    "show me the latest research",
+    "analyze trends in my field",
+    "generate a research proposal",
+]
+
+
+def endpoint_requests(topics):
+    """name -> callable(session, base_url, i) issuing one request"""
+    def topic(i):
+        return topics[i % len(topics)]
+
+    return {
+        "fetch-papers": lambda s, url, i: s.get(f"{url}/fetch-papers", params={"topic": topic(i), "max_results": 10}),
+        "analyze": lambda s, url, i: s.get(
+            f"{url}/analyze", params={"topic": topic(i), "max_results": 25, "scoring": "tfidf"}),
+        "trends": lambda s, url, i: s.get(f"{url}/trends", params={"topic": topic(i), "max_results": 10}),
+        "search": lambda s, url, i: s.get(f"{url}/search", params={"q": topic(i).split()[0]}),
+        "innovate": lambda s, url, i: s.get(f"{url}/innovate", params={"topic": topic(i), "max_results": 10}),
+        "chat": lambda s, url, i: s.post(
+            f"{url}/chat", json={"message": CHAT_MESSAGES[i % len(CHAT_MESSAGES)].format(topic=topic(i))}),
+        "chat-history": lambda s, url, i: s.get(f"{url}/chat/history", params={"limit": 50}),
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args} exited with {process.returncode}")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def worker_pids(pid):
+    """The app process plus any uvicorn worker processes it spawned"""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [pid] + [int(p) for p in f.read().split()]
+    except OSError:
+        return [pid]
+
+
+def app_rss_mb(pid):
+    """Total RSS of the app across its worker processes"""
+    sizes = [rss_mb(p) for p in worker_pids(pid)]
+    return round(sum(s for s in sizes if s), 1) if any(sizes) else None
+
+
+def login(base_url, username="loadtest", password="loadtest"):
+    session = requests.Session()
+    session.post(f"{base_url}/register", data={"username": username, "password": password}, allow_redirects=False)
+    response = session.post(f"{base_url}/login", data={"username": username, "password": password},
+                            allow_redirects=False)
+    if response.status_code != 302:
+        raise RuntimeError(f"login failed: {response.status_code} {response.text}")
+    return session.cookies
+
+
+def run_endpoint(name, send, base_url, cookies, n_requests, concurrency, warmup, pid):
+    """Fire n_requests at one endpoint from `concurrency` threads, one session per thread"""
+    sessions = []
+    for _ in range(concurrency):
+        session = requests.Session()
+        session.cookies.update(cookies)
+        sessions.append(session)
+    counter = itertools.count()
+
+    def one(i):
+        session = sessions[i % concurrency]
+        started = time.perf_counter()
+        try:
+            response = send(session, base_url, i)
+            status = response.status_code
+        except requests.RequestException:
+            status = None
+        return (time.perf_counter() - started) * 1000, status
+
+    for i in range(warmup):
+        one(next(counter))
+
+    rss_before = app_rss_mb(pid)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, (next(counter) for _ in range(n_requests))))
+    elapsed = time.perf_counter() - started
+
+    statuses = {}
+    for _, status in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    result = summarize([ms for ms, _ in outcomes], elapsed)
+    result["errors"] = sum(n for status, n in statuses.items() if status == "None" or int(status) >= 400)
+    result["status_codes"] = statuses
+    result["rss_mb_before"] = rss_before
+    result["rss_mb_after"] = app_rss_mb(pid)
+    print(f"{name:<14} p50 {result['p50_ms']:>9.1f} ms   p95 {result['p95_ms']:>9.1f} ms   "
+          f"p99 {result['p99_ms']:>9.1f} ms   {result['throughput_per_s']:>8.1f} req/s   "
+          f"errors {result['errors']:>4}   rss {result['rss_mb_after']} MB")
+    for session in sessions:
+        session.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", default="fetch-papers,analyze,trends,search,innovate,chat,chat-history",
+                        help="comma-separated endpoints, run in this order")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--warmup", type=int, default=5, help="unrecorded requests per endpoint")
+    parser.add_argument("--topics", type=int, default=20,
+                        help="distinct topics to cycle through; fewer topics means more cache hits")
+    parser.add_argument("--arxiv-latency", type=float, default=0.05, help="seconds per fake arXiv request")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake LLM call")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes for the app")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    topics = [" ".join(rng.sample(VOCABULARY, 2)) for _ in range(args.topics)]
+    senders = endpoint_requests(topics)
+    endpoints = args.endpoints.split(",")
+    unknown = [e for e in endpoints if e not in senders]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)} (choose from {', '.join(senders)})")
+
+    arxiv_port, app_port = free_port(), free_port()
+    arxiv_url = f"http://127.0.0.1:{arxiv_port}/api/query"
+    base_url = f"http://127.0.0.1:{app_port}"
+    env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+    processes = []
+    workdir = tempfile.TemporaryDirectory(prefix="adaptive-agent-load-")
+    try:
+        arxiv = subprocess.Popen(
+            [sys.executable, str(BENCH_DIR / "fakes.py"), "--port", str(arxiv_port),
+             "--latency", str(args.arxiv_latency)], env=env)
+        processes.append(arxiv)
+        app = subprocess.Popen(
+            [sys.executable, str(BENCH_DIR / "serve.py"), "--arxiv-url", arxiv_url, "--port", str(app_port),
+             "--llm-latency", str(args.llm_latency), "--workers", str(args.workers), "--workdir", workdir.name],
+            env=env)
+        processes.append(app)
+        wait_until_up(arxiv_url, arxiv)
+        wait_until_up(f"{base_url}/login-page", app)
+
+        cookies = login(base_url)
+        results = {"startup": {"rss_mb": app_rss_mb(app.pid)}}
+        for name in endpoints:
+            results[name] = run_endpoint(name, senders[name], base_url, cookies, args.requests,
+                                         args.concurrency, args.warmup, app.pid)
+        results["upstream"] = {"arxiv_requests": requests.get(arxiv_url.replace("/api/query", "/stats")).json()["requests"]}
+
+        stats = requests.Session()
+        stats.cookies.update(cookies)
+        results["server_stats"] = {
+            path.strip("/"): stats.get(f"{base_url}{path}").json()
+            for path in ("/cache-stats", "/llm-stats", "/bus-stats")
+        }
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        workdir.cleanup()
+
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    write_report("load", config, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Micro-benchmarks for the CPU-bound hot paths: feed parsing, keyword extraction,
+proposal formatting and the SQLite writes behind /innovate and /chat.
+
+    python benchmarks/micro.py --output micro.json
+"""
+import argparse
+import itertools
+import time
+
+from common import prepare_app_environment, summarize, rss_mb, write_report
+from fakes import synthetic_feed, synthetic_proposal, VOCABULARY
+
+
+def bench(name, fn, min_time=1.0, min_runs=5, max_runs=10000, warmup=2):
+    """Call fn repeatedly for at least min_time seconds and summarize per-call latency"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < max_runs and (len(samples) < min_runs or time.perf_counter() - started < min_time):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    result = summarize(samples)
+    print(f"{name:<40} p50 {result['p50_ms']:>10.3f} ms   p95 {result['p95_ms']:>10.3f} ms   "
+          f"{result['throughput_per_s']:>10.1f} ops/s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds spent on each benchmark")
+    parser.add_argument("--sizes", default="10,100,1000", help="comma-separated feed sizes")
+    parser.add_argument("--workdir", help="scratch directory for data.db (default: a new temp dir)")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    prepare_app_environment(args.workdir)
+    from agents.research_agent import parse_arxiv_feed  # type: ignore
+    from agents.analysis_agent import analyze_papers, top_keywords, index_papers  # type: ignore
+    from agents.innovation_agent import format_innovation_proposal, ProposalStreamFormatter  # type: ignore
+    from agents.database import init_db, get_db_connection, save_proposal, save_chat_message  # type: ignore
+    from agents.search import search_papers  # type: ignore
+    init_db()
+
+    results = {}
+
+    def run(name, fn):
+        results[name] = bench(name, fn, min_time=args.min_time)
+
+    feeds = {n: synthetic_feed(n, topic="bench") for n in sizes}
+    papers = {n: parse_arxiv_feed(feed) for n, feed in feeds.items()}
+
+    for n in sizes:
+        run(f"parse_arxiv_feed[{n}]", lambda n=n: parse_arxiv_feed(feeds[n]))
+    for n in sizes:
+        run(f"analyze_papers[{n}]", lambda n=n: analyze_papers(papers[n]))
+        run(f"top_keywords_tfidf_bigrams[{n}]",
+            lambda n=n: top_keywords(papers[n], scoring="tfidf", bigrams=True))
+
+    proposal = synthetic_proposal(VOCABULARY[:5])
+    chunks = [proposal[i:i + 24] for i in range(0, len(proposal), 24)]
+
+    def stream_format():
+        formatter = ProposalStreamFormatter()
+        for chunk in chunks:
+            formatter.feed(chunk)
+        formatter.flush()
+
+    run("format_innovation_proposal", lambda: format_innovation_proposal(proposal))
+    run("proposal_stream_formatter", stream_format)
+
+    conn = get_db_connection()
+    try:
+        conn.execute("INSERT OR IGNORE INTO users (username, password) VALUES ('bench', 'bench')")
+        conn.commit()
+    finally:
+        conn.close()
+
+    keywords = [(w, 3) for w in VOCABULARY[:5]]
+    run("save_proposal", lambda: save_proposal("bench", "bench", keywords, proposal))
+    run("save_chat_message", lambda: save_chat_message("bench", "find papers about graph learning", True))
+    # A fresh topic per call so every paper is new to the index
+    topics = itertools.count()
+    run(f"index_papers[{sizes[-1]}]", lambda: index_papers(f"bench-{next(topics)}", papers[sizes[-1]]))
+
+    conn = get_db_connection()
+    try:
+        conn.executemany(
+            "INSERT INTO paper_cache (topic, title, summary, published, link) VALUES (?, ?, ?, ?, ?)",
+            [("bench", p["title"], p["summary"], p["published"], p["link"]) for p in papers[sizes[-1]]]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    run("search_papers", lambda: search_papers("graph neural", limit=10))
+
+    write_report("micro", {"min_time": args.min_time, "sizes": sizes, "rss_mb": rss_mb()}, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Run the FastAPI app against the fake arXiv server and a fake ChatGroq.
+
+Started by load.py; can also be run by hand to poke at the app offline:
+
+    python benchmarks/fakes.py --port 8081 &
+    python benchmarks/serve.py --arxiv-url http://127.0.0.1:8081/api/query --port 8000 --workers 4
+"""
+import argparse
+import os
+
+from common import prepare_app_environment
+from fakes import FakeChatGroq
+
+
+def create_app():
+    """App factory; each uvicorn worker process calls it, so settings travel in environment variables"""
+    prepare_app_environment(os.environ["BENCH_WORKDIR"])
+    from agents import innovation_agent, research_agent  # type: ignore
+
+    innovation_agent.llm = FakeChatGroq(
+        latency=float(os.environ["BENCH_LLM_LATENCY"]),
+        tokens_per_second=float(os.environ["BENCH_LLM_TOKENS_PER_SECOND"]),
+    )
+    research_agent.arxiv_client.base_url = os.environ["BENCH_ARXIV_URL"]
+    research_agent.ARXIV_PAGE_DELAY_SECONDS = 0  # the arXiv politeness delay only matters for the real API
+
+    import main as app_main  # type: ignore
+    return app_main.app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--arxiv-url", required=True, help="base URL of the fake arXiv API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds to the first LLM token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0,
+                        help="pace streamed LLM output (0 returns the whole response at once)")
+    parser.add_argument("--workdir", help="scratch directory for data.db and config.json")
+    args = parser.parse_args()
+
+    workdir = prepare_app_environment(args.workdir)
+    os.environ.update({
+        "BENCH_WORKDIR": str(workdir),
+        "BENCH_ARXIV_URL": args.arxiv_url,
+        "BENCH_LLM_LATENCY": str(args.llm_latency),
+        "BENCH_LLM_TOKENS_PER_SECOND": str(args.llm_tokens_per_second),
+        # Tells the app it has sibling workers (uvicorn reads the same variable for --workers)
+        "WEB_CONCURRENCY": str(args.workers),
+    })
+    import uvicorn  # type: ignore
+
+    print(f"Serving from {workdir} on http://{args.host}:{args.port} with {args.workers} worker(s)", flush=True)
+    uvicorn.run("serve:create_app", factory=True, host=args.host, port=args.port, workers=args.workers,
+                log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
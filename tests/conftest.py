@@ -0,0 +1,21 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# The app imports its modules as agents.*, relative to adaptive_agent/
+sys.path.insert(0, str(ROOT / "adaptive_agent"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+
+@pytest.fixture(autouse=True)
+def db(tmp_path, monkeypatch):
+    """A fresh, migrated data.db and agent log writer per test; the connection pool follows DB_PATH"""
+    from agents import database  # type: ignore
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "data.db"))
+    # Stopped (and joined) before DB_PATH is restored, so no batch lands in ./data.db
+    monkeypatch.setattr(database, "agent_logger", database.AgentLogWriter(flush_interval=0.05))
+    database.init_db()
+    yield database
+    database.agent_logger.stop()
@@ -0,0 +1,35 @@
+from agents.database import AgentLogWriter  # type: ignore
+
+
+def logged_actions(db):
+    conn = db.get_db_connection()
+    try:
+        return [row["action_type"] for row in conn.execute("SELECT action_type FROM agent_logs WHERE agent_name='test' ORDER BY id")]
+    finally:
+        conn.close()
+
+
+def test_stop_flushes_queued_events(db):
+    writer = AgentLogWriter(flush_interval=0.05)
+    writer.log("test", "queued", {})
+    writer.stop()
+    assert logged_actions(db) == ["queued"]
+
+
+def test_events_after_stop_are_written_without_a_new_thread(db):
+    writer = AgentLogWriter()
+    writer.log("test", "before", {})
+    writer.stop()
+    writer.log("test", "after", {})
+    assert writer._thread is None
+    assert logged_actions(db) == ["before", "after"]
+
+
+def test_full_queue_drops_without_waiting(db):
+    writer = AgentLogWriter(max_queue=1)
+    writer.start = lambda: None  # nothing drains the queue
+    writer.log("test", "kept", {})
+    writer.log("test", "dropped", {})
+    assert writer.get_stats() == {"logged": 1, "written": 0, "dropped": 1, "flushes": 0, "errors": 0, "queued": 1}
+    writer.flush()
+    assert logged_actions(db) == ["kept"]
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("numpy")      # keyword analysis
+pytest.importorskip("requests")   # imported by the research agent
+
+from agents import batch  # type: ignore
+
+PAPERS = [{"title": "Graph networks", "summary": "Message passing over molecular graphs.",
+           "published": "2024-05-01T00:00:00Z", "link": "http://arxiv.org/abs/1v1"}]
+
+
+@pytest.fixture
+def fakes(db, monkeypatch):
+    conn = db.get_db_connection()
+    conn.execute("INSERT INTO users (username, password) VALUES ('alice', 'secret')")
+    conn.commit()
+    conn.close()
+
+    async def fetch(topic, max_results=5):
+        return PAPERS
+
+    async def ideas(keyword_lists, user=None):
+        await state["gate"].wait()
+        for i, _ in enumerate(keyword_lists):
+            yield i, f"Proposal {i}"
+
+    state = {"gate": None}
+    monkeypatch.setattr(batch, "afetch_arxiv_papers", fetch)
+    monkeypatch.setattr(batch, "abatch_research_ideas", ideas)
+    monkeypatch.setattr(batch, "BATCH_STREAM_POLL_SECONDS", 0.01)
+    return state
+
+
+def test_status_and_stream_come_from_the_database(fakes):
+    async def main():
+        fakes["gate"] = asyncio.Event()
+        fakes["gate"].set()
+        job = await batch.start_batch_job("alice", ["graphs", "proteins"])
+        await job._task
+        batch.running_jobs.clear()   # as seen from another worker
+        return job.id, [event async for event in batch.stream_batch_job(job.id)]
+
+    job_id, events = asyncio.run(main())
+    assert [e["type"] for e in events] == ["result", "result", "done"]
+    assert events[-1]["done"] == 2
+    status = batch.get_batch_job(job_id, "alice")
+    assert status["status"] == "completed" and status["done"] == 2
+    assert all(r["proposal_id"] for r in status["results"])
+    assert batch.get_batch_job(job_id, "mallory") is None
+
+
+def test_running_jobs_are_capped_per_user(fakes):
+    async def main():
+        fakes["gate"] = asyncio.Event()
+        jobs = [await batch.start_batch_job("alice", ["graphs"]) for _ in range(batch.BATCH_MAX_RUNNING_PER_USER)]
+        with pytest.raises(batch.BatchJobLimitError):
+            await batch.start_batch_job("alice", ["graphs"])
+        fakes["gate"].set()
+        await asyncio.gather(*(job._task for job in jobs))
+        await batch.start_batch_job("alice", ["graphs"])   # a slot is free again
+        await asyncio.gather(*(job._task for job in batch.running_jobs.values()))
+
+    asyncio.run(main())
+
+
+def test_max_results_is_bounded(fakes):
+    for max_results in (0, batch.BATCH_MAX_RESULTS + 1):
+        with pytest.raises(ValueError):
+            asyncio.run(batch.start_batch_job("alice", ["graphs"], max_results))
+
+
+def test_job_abandoned_by_its_worker_reports_failure(db, fakes):
+    job = batch.BatchJob("alice", ["graphs"])
+    assert batch._insert_job(job)
+    conn = db.get_db_connection()
+    conn.execute("UPDATE batch_jobs SET updated_at=? WHERE id=?", (time.time() - batch.BATCH_STALE_SECONDS - 1, job.id))
+    conn.commit()
+    conn.close()
+    assert batch.get_batch_job(job.id, "alice")["status"] == "failed"
+
+    async def main():
+        return [event async for event in batch.stream_batch_job(job.id)]
+
+    assert asyncio.run(main())[-1]["type"] == "done"
@@ -0,0 +1,40 @@
+from agents.conversation import compact_chat_history, get_chat_history  # type: ignore
+
+
+def add_turns(db, user_id, count):
+    conn = db.get_db_connection()
+    try:
+        for n in range(count):
+            conn.execute("INSERT INTO chat_history (user_id, message, is_user) VALUES (?, ?, ?)",
+                         (user_id, f"turn {n}", n % 2 == 0))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def all_pages(user_id, limit):
+    pages, before = [], None
+    while True:
+        page = get_chat_history(user_id, before, limit)
+        pages.append(page)
+        if not page["has_more"]:
+            return pages
+        before = page["next_before_id"]
+
+
+def test_pages_continue_into_the_archive(db):
+    add_turns(db, 1, 10)
+    assert compact_chat_history(keep=4)["archived"] == 6
+
+    pages = all_pages(1, 3)
+    messages = [m["message"] for page in pages for m in page["messages"]]
+    assert messages == [f"turn {n}" for n in range(9, -1, -1)]
+    # the second page straddles the live table and the archive
+    assert [len(page["messages"]) for page in pages] == [3, 3, 3, 1]
+
+
+def test_has_more_is_false_without_an_archive(db):
+    add_turns(db, 1, 4)
+    page = get_chat_history(1, None, 4)
+    assert len(page["messages"]) == 4
+    assert page["has_more"] is False and page["next_before_id"] is None
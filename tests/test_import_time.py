@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from common import APP_DIR
+
+pytest.importorskip("fastapi")
+
+IMPORT_BUDGET_MS = 3000   # looser than benchmarks/import_time.py's 1500 ms default; test machines vary
+LAZY_MODULES = ("langchain", "langchain_core", "langchain_groq", "groq")
+
+PROBE = f"""
+import sys, time
+started = time.perf_counter()
+import main
+print((time.perf_counter() - started) * 1000)
+print(",".join(sorted(m for m in sys.modules if m.split(".")[0] in {LAZY_MODULES!r})))
+"""
+
+
+def test_importing_main_is_fast_and_defers_langchain(tmp_path):
+    (tmp_path / "static").symlink_to(APP_DIR / "static", target_is_directory=True)
+    env = {key: value for key, value in os.environ.items() if key != "GROQ_API_KEY"}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(APP_DIR), env.get("PYTHONPATH")]))
+    result = subprocess.run([sys.executable, "-c", PROBE], cwd=tmp_path, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    elapsed_ms, loaded = result.stdout.split("\n")[-3:-1]   # main may print while importing
+    assert loaded == "", f"imported at startup: {loaded}"
+    assert float(elapsed_ms) < IMPORT_BUDGET_MS
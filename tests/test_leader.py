@@ -0,0 +1,54 @@
+import time
+
+from agents.leader import Lease, LeaderElection  # type: ignore
+
+
+def test_second_holder_cannot_take_a_live_lease():
+    first = Lease("job", ttl=5, holder="worker-a")
+    second = Lease("job", ttl=5, holder="worker-b")
+    assert first.try_acquire()
+    assert first.held
+    assert not second.try_acquire()
+    assert not second.held
+    assert second.current()["holder"] == "worker-a"
+
+
+def test_holder_renews_its_own_lease():
+    lease = Lease("job", ttl=5, holder="worker-a")
+    assert lease.try_acquire({"n": 1})
+    acquired_at = lease.current()["acquired_at"]
+    assert lease.try_acquire({"n": 2})
+    current = lease.current()
+    assert current["acquired_at"] == acquired_at
+    assert current["info"] == {"n": 2}
+
+
+def test_expired_lease_is_stolen():
+    first = Lease("job", ttl=0.2, holder="worker-a")
+    second = Lease("job", ttl=5, holder="worker-b")
+    assert first.try_acquire()
+    time.sleep(0.3)
+    assert not first.held
+    assert second.try_acquire()
+    assert second.current()["holder"] == "worker-b"
+    assert not first.try_acquire()
+
+
+def test_release_hands_over_immediately():
+    first = Lease("job", ttl=5, holder="worker-a")
+    second = Lease("job", ttl=5, holder="worker-b")
+    assert first.try_acquire()
+    first.release()
+    assert first.current() is None
+    assert second.try_acquire()
+
+
+def test_leader_election_status():
+    election = LeaderElection("job", ttl=5, info=lambda: {"topic": "ai"})
+    assert election.renew()
+    status = election.get_status()
+    assert status["is_leader"]
+    assert status["info"] == {"topic": "ai"}
+    election.stop()
+    assert not election.is_leader
+    assert election.get_status()["leader"] is None
@@ -0,0 +1,45 @@
+import asyncio
+
+from agents import innovation_agent  # type: ignore
+from fakes import FakeChatGroq, FakeMessage
+
+KEYWORDS = ["alpha", "beta"]
+
+
+class FakePrompt:
+    def format_prompt(self, keywords):
+        return self
+
+    def to_messages(self):
+        return [FakeMessage("Keywords: alpha, beta")]
+
+
+def add_user(db):
+    conn = db.get_db_connection()
+    conn.execute("INSERT INTO users (username, password) VALUES ('alice', 'secret')")
+    conn.commit()
+    conn.close()
+
+
+def test_warm_up_skips_blank_and_failed_proposals(db):
+    add_user(db)
+    for text in ("", "   ", "❌ Failed to generate proposal."):
+        db.save_proposal("alice", "ai", KEYWORDS, text)
+    assert innovation_agent.warm_llm_cache_from_proposals() == 0
+
+    db.save_proposal("alice", "ai", KEYWORDS, "A proposal")
+    assert innovation_agent.warm_llm_cache_from_proposals() == 1
+
+
+def test_empty_cached_response_is_a_miss(db, monkeypatch):
+    client = FakeChatGroq(latency=0)
+    monkeypatch.setattr(innovation_agent, "llm", client)
+    monkeypatch.setattr(innovation_agent, "proposal_prompt", FakePrompt())
+    conn = db.get_db_connection()
+    innovation_agent._cache_store(conn, innovation_agent._llm_cache_key(KEYWORDS), KEYWORDS, "")
+    conn.commit()
+    conn.close()
+
+    assert innovation_agent.generate_research_idea(["Beta", "alpha"])
+    assert asyncio.run(innovation_agent.agenerate_research_idea(["Beta", "alpha"]))
+    assert client.calls == 1   # the first call replaced the empty entry
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from agents.innovation_agent import LLMGateway, LLMGatewayError  # type: ignore
+from fakes import FakeChatGroq
+
+
+def gateway(**overrides):
+    settings = {"max_concurrency": 1, "max_queue": 8, "max_queue_per_user": 4, "queue_timeout": 5.0,
+                "rate_per_minute": 0}
+    return LLMGateway(**{**settings, **overrides})
+
+
+def test_users_are_served_round_robin():
+    llm = FakeChatGroq(latency=0.01)
+    gw = gateway()
+    started = []
+
+    async def call(user, n):
+        async with gw.aslot(user):
+            started.append(f"{user}{n}")
+            await llm.ainvoke(["Keywords: a, b"])
+
+    async def main():
+        first = asyncio.create_task(call("a", 1))
+        await asyncio.sleep(0)   # a1 takes the only slot
+        rest = [call("a", 2), call("a", 3), call("a", 4), call("b", 1), call("b", 2)]
+        await asyncio.gather(first, *rest)
+
+    asyncio.run(main())
+    assert started == ["a1", "a2", "b1", "a3", "b2", "a4"]
+    assert llm.calls == 6
+    assert gw.get_stats()["admitted"] == 6
+    assert gw.active == 0
+
+
+def test_user_over_queue_share_gets_429():
+    gw = gateway(max_queue_per_user=1)
+    gw.acquire("a")
+
+    async def main():
+        waiting_a = asyncio.create_task(gw.aacquire("a"))
+        await asyncio.sleep(0)
+        with pytest.raises(LLMGatewayError) as error:
+            await gw.aacquire("a")
+        assert error.value.status_code == 429
+        waiting_b = asyncio.create_task(gw.aacquire("b"))   # other users still get in line
+        await asyncio.sleep(0)
+        assert gw.get_stats()["queued"] == 2
+        gw.release()
+        await waiting_a
+        gw.release()
+        await waiting_b
+        gw.release()
+
+    asyncio.run(main())
+    assert gw.get_stats()["rejected_user_limit"] == 1
+    assert gw.active == 0
+
+
+def test_full_queue_is_shed_with_503():
+    gw = gateway(max_queue=1)
+    gw.acquire("a")
+
+    async def main():
+        waiting = asyncio.create_task(gw.aacquire("b"))
+        await asyncio.sleep(0)
+        with pytest.raises(LLMGatewayError) as error:
+            await gw.aacquire("c")
+        assert error.value.status_code == 503
+        assert error.value.retry_after == gw.queue_timeout
+        gw.release()
+        await waiting
+        gw.release()
+
+    asyncio.run(main())
+    assert gw.get_stats()["rejected_queue_full"] == 1
+
+
+def test_queue_timeout_gives_up_with_503_and_frees_the_queue():
+    gw = gateway(queue_timeout=0.05)
+    gw.acquire("a")
+    with pytest.raises(LLMGatewayError) as error:
+        gw.acquire("b")
+    assert error.value.status_code == 503
+    stats = gw.get_stats()
+    assert stats["timed_out"] == 1
+    assert stats["queued"] == 0
+    gw.release()
+
+
+def test_rate_limit_paces_starts():
+    gw = gateway(max_concurrency=4, rate_per_minute=600, burst=1)   # one start per 0.1 s after the first
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        started = []
+
+        async def call():
+            async with gw.aslot("a"):
+                started.append(loop.time())
+
+        await asyncio.gather(call(), call(), call())
+        return started
+
+    started = asyncio.run(main())
+    assert started[2] - started[0] >= 0.15
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from agents.message_bus import MessageBus  # type: ignore
+
+
+def test_subscribers_only_see_their_correlation_id():
+    bus = MessageBus()
+
+    async def main():
+        first = bus.subscribe("papers", correlation_id="run-1")
+        second = bus.subscribe("papers", correlation_id="run-2")
+        everything = bus.subscribe("papers")
+        bus.publish("papers", ["p1"], correlation_id="run-1")
+        bus.publish("papers", ["p2"], correlation_id="run-2")
+        bus.publish("papers", ["broadcast"])
+        await asyncio.sleep(0)
+
+        assert (await first.get(timeout=1)).data == ["p1"]
+        assert first.queue.empty()
+        assert (await second.get(timeout=1)).data == ["p2"]
+        assert second.queue.empty()
+        assert [(await everything.get(timeout=1)).data for _ in range(3)] == [["p1"], ["p2"], ["broadcast"]]
+
+    asyncio.run(main())
+
+
+def test_wait_for_returns_retained_value_and_ignores_other_runs():
+    bus = MessageBus()
+
+    async def main():
+        bus.publish("keywords", ["k1"], correlation_id="run-1")
+        assert await bus.wait_for("keywords", "run-1", timeout=1) == ["k1"]
+
+        waiter = asyncio.create_task(bus.wait_for("keywords", "run-2", timeout=1))
+        await asyncio.sleep(0)
+        bus.publish("keywords", ["other"], correlation_id="run-3")
+        bus.publish("keywords", ["k2"], correlation_id="run-2")
+        assert await waiter == ["k2"]
+
+        with pytest.raises(asyncio.TimeoutError):
+            await bus.wait_for("keywords", "run-4", timeout=0.05)
+
+    asyncio.run(main())
+
+
+def test_release_drops_retained_messages():
+    bus = MessageBus()
+    bus.publish("papers", ["p1"], correlation_id="run-1")
+    bus.publish("papers", ["p2"], correlation_id="run-2")
+    bus.release("run-1")
+    assert bus.consume("papers", "run-1") is None
+    assert bus.consume("papers", "run-2") == ["p2"]
+
+
+
+def test_durable_messages_are_replayed_until_processed(db):
+    before_restart = MessageBus(durable=True)
+    before_restart.publish("keywords", [["graph", 3]], correlation_id="run-1", sender="analysis_agent")
+
+    bus = MessageBus(durable=True)
+    assert bus.replay() == 1
+    assert [m["sender"] for m in bus.pending("keywords")] == ["analysis_agent"]
+
+    async def main():
+        return await bus.wait_for("keywords", "run-1", timeout=1)
+
+    assert asyncio.run(main()) == [["graph", 3]]
+    assert bus.pending() == []
+    assert MessageBus(durable=True).replay() == 0
+
+
+def persisted(db, topic):
+    conn = db.get_db_connection()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM agent_messages WHERE message_type=?", (topic,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_shared_bus_keeps_one_row_per_shared_topic(db):
+    bus = MessageBus(shared=True, shared_topics={"papers"})
+    for i in range(5):
+        bus.publish("papers", [i])
+    assert bus.consume("papers") == [4]
+    assert persisted(db, "papers") == 1
+
+
+def test_shared_bus_only_writes_shared_broadcasts(db):
+    bus = MessageBus(shared=True)
+    bus.publish("papers", ["local"])
+    bus.publish("keywords", ["k1"], correlation_id="run-1")
+    bus.share("config")
+    bus.publish("config", {"topic": "ai"}, correlation_id="run-1")
+    assert bus.consume("papers") == ["local"]
+    assert persisted(db, "papers") == persisted(db, "keywords") == persisted(db, "config") == 0
@@ -0,0 +1,29 @@
+import pytest
+
+from agents.paper import Paper, PaperBatch  # type: ignore
+
+PAPERS = [
+    Paper("Graph networks", "Message passing on molecular graphs.", "2024-05-01T00:00:00Z", "http://arxiv.org/abs/1v1"),
+    {"title": "Diffusion models", "summary": "Denoising diffusion for molecular graphs.",
+     "published": "2024-05-02T12:30:00Z", "link": "http://arxiv.org/abs/2v1"},
+]
+
+
+def test_batch_holds_papers_and_dicts_as_columns():
+    batch = PaperBatch.from_papers(PAPERS)
+    assert len(batch) == 2
+    assert batch.links == ["http://arxiv.org/abs/1v1", "http://arxiv.org/abs/2v1"]
+    assert list(batch.texts())[1] == "Diffusion models Denoising diffusion for molecular graphs."
+    assert batch[1]["published"] == "2024-05-02T12:30:00Z"
+    assert [p.link for p in batch] == batch.links
+    assert PaperBatch.from_papers(batch) is batch
+
+
+def test_top_keywords_accepts_lists_and_batches():
+    pytest.importorskip("numpy")
+    from agents.analysis_agent import top_keywords  # type: ignore
+
+    batch = PaperBatch.from_papers(PAPERS)
+    for scoring in ("count", "tfidf"):
+        assert top_keywords(PAPERS, k=3, scoring=scoring) == top_keywords(batch, k=3, scoring=scoring)
+    assert top_keywords(batch, k=2)[0] == ("molecular", 2)
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("numpy")      # the analysis stage vectorizes with numpy
+pytest.importorskip("requests")   # imported by the research agent
+
+from agents import innovation_agent, pipeline  # type: ignore
+from agents.message_bus import bus  # type: ignore
+from fakes import FakeChatGroq, FakeMessage
+
+PAPERS = [
+    {"title": f"Graph neural networks for molecules {n}",
+     "summary": "Graph neural networks learn molecular property prediction from molecular graphs.",
+     "published": "2024-05-01T00:00:00Z", "link": f"http://arxiv.org/abs/2405.0000{n}v1"}
+    for n in range(3)
+]
+
+
+class FakePrompt:
+    def format_prompt(self, keywords):
+        return self
+
+    def to_messages(self):
+        return [FakeMessage("Keywords: graph")]
+
+
+class FailingChatGroq:
+    async def ainvoke(self, messages, **kwargs):
+        raise RuntimeError("provider is down")
+
+
+@pytest.fixture
+def llm(db, monkeypatch):
+    async def fetch(topic, max_results=5, use_cache=True, correlation_id=None):
+        bus.publish("papers", PAPERS, correlation_id=correlation_id, sender="research_agent")
+        return PAPERS
+
+    monkeypatch.setattr(pipeline, "afetch_arxiv_papers", fetch)
+    monkeypatch.setattr(innovation_agent, "proposal_prompt", FakePrompt())
+    conn = db.get_db_connection()
+    conn.execute("INSERT INTO users (username, password) VALUES ('alice', 'secret')")
+    conn.commit()
+    conn.close()
+
+    def install(client):
+        monkeypatch.setattr(innovation_agent, "llm", client)
+        return client
+    return install
+
+
+def proposal_rows(db):
+    conn = db.get_db_connection()
+    try:
+        return conn.execute("SELECT proposal_text FROM proposals").fetchall()
+    finally:
+        conn.close()
+
+
+def test_proposal_is_saved_with_its_text(db, llm):
+    llm(FakeChatGroq(latency=0.01))
+    result = asyncio.run(pipeline.run_pipeline("graphs", user="alice"))
+    rows = proposal_rows(db)
+    assert len(rows) == 1 and rows[0]["proposal_text"] == result["proposal"] != ""
+    assert result["proposal_id"] is not None
+
+
+def test_llm_failure_raises_stage_error_and_saves_nothing(db, llm):
+    llm(FailingChatGroq())
+    with pytest.raises(pipeline.StageError) as error:
+        asyncio.run(pipeline.run_pipeline("graphs", user="alice"))
+    assert error.value.stage == "generate" and "provider is down" in str(error.value)
+    assert proposal_rows(db) == []
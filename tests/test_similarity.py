@@ -0,0 +1,45 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from agents.similarity import SimilarityIndex  # type: ignore
+
+SUMMARY = "Message passing neural networks predict molecular properties from atom and bond graphs."
+PAPERS = [
+    {"title": "Graph networks for molecules", "summary": SUMMARY,
+     "published": "2024-05-01T00:00:00Z", "link": "http://arxiv.org/abs/2405.00001v1"},
+    {"title": "Graph networks for molecules", "summary": SUMMARY,
+     "published": "2024-05-02T00:00:00Z", "link": "http://arxiv.org/abs/2405.00002v1"},
+    {"title": "Robot grasping", "summary": "Reinforcement learning for dexterous robotic manipulation.",
+     "published": "2024-05-03T00:00:00Z", "link": "http://arxiv.org/abs/2405.00003v1"},
+]
+
+
+def cache_papers(db, papers):
+    conn = db.get_db_connection()
+    conn.executemany(
+        "INSERT INTO paper_cache (topic, title, summary, published, link) VALUES ('ai', ?, ?, ?, ?)",
+        [(p["title"], p["summary"], p["published"], p["link"]) for p in papers]
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_near_duplicate_is_skipped_and_left_out_of_document_frequency():
+    index = SimilarityIndex()
+    assert index.add_papers(PAPERS) == 2
+    assert index.stats["near_duplicates"] == 1
+
+    reference = SimilarityIndex()
+    reference.add_papers([PAPERS[0], PAPERS[2]])
+    assert (index.df == reference.df).all()
+
+
+def test_rebuild_keeps_near_duplicates_out(db):
+    cache_papers(db, PAPERS)
+    SimilarityIndex().add_papers(PAPERS)   # ingest finds and saves the duplicate
+
+    rebuilt = SimilarityIndex()
+    assert rebuilt.rebuild_from_cache() == 2
+    related = rebuilt.related([PAPERS[1]["link"]])[PAPERS[1]["link"]]
+    assert [r["link"] for r in related] == [PAPERS[2]["link"]]